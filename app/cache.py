@@ -0,0 +1,20 @@
+# cache.py
+
+"""
+Cached database reads shared by more than one UI module.
+Page-specific cached readers stay private to their page.
+"""
+
+import streamlit as st
+
+from utils.flashcards_db import get_decks
+
+
+# `version` is the DB write counter, so any write changes the cache key
+# and the next rerun reads fresh rows.
+@st.cache_data(show_spinner=False)
+def cached_get_decks(version: int) -> list[tuple[int, str]]:
+    """
+    Cached wrapper around get_decks, used by the deck list and the generation sidebar.
+    """
+    return get_decks()
@@ -5,13 +5,16 @@ Defines modal dialogs for creating and importing decks, notebooks, and deleting
 Utilizes Streamlit's @st.dialog decorator for user interactions in pop-up windows.
 """
 
-import json
+import sqlite3
+
 import streamlit as st
 
 from notebooks import DEFAULT_NOTE_CONTENT
-from utils.flashcards_db import create_deck
+from utils import json_helper
+from utils.flashcards_db import bump_db_version, conn, create_deck, db_lock
 from utils.notes_db import (
-    create_notebook, get_notes, create_note, delete_note
+    create_notebook, get_notes, create_note, delete_note,
+    c as notes_c, conn as notes_conn
 )
 
 @st.dialog("Create Deck", width="small")
@@ -79,36 +82,40 @@ def import_deck_dialog() -> None:
             if imported_file is not None:
                 try:
                     # Load JSON data
-                    data = json.load(imported_file)
+                    data = json_helper.loads(imported_file.read())
                     imported_deck_name = data.get("name")
                     cards_list = data.get("cards", [])
 
                     if imported_deck_name:
                         # Perform DB inserts for deck and its cards
-                        from utils.flashcards_db import c, conn
-                        import sqlite3
                         try:
-                            # Insert deck record
-                            c.execute(
-                                "INSERT INTO decks (name) VALUES (?)",
-                                (imported_deck_name,)
-                            )
-                            conn.commit()
-                            new_deck_id = c.lastrowid
-
-                            # Insert each card entry
-                            for card in cards_list:
-                                front = card.get("front", "")
-                                back = card.get("back", "")
-                                c.execute(
-                                    """
-                                    INSERT INTO cards
-                                        (deck_id, front, back, next_review, interval, repetition, ef, extra_fields)
-                                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                                    """,
-                                    (new_deck_id, front, back, None, 0, 0, 2.5, None)
-                                )
-                            conn.commit()
+                            # Insert deck and cards in a single transaction so a
+                            # failure rolls back the half-imported deck; the version is
+                            # bumped after the commit, still under the lock, like every writer
+                            with db_lock:
+                                with conn:
+                                    cur = conn.execute(
+                                        "INSERT INTO decks (name) VALUES (?)",
+                                        (imported_deck_name,)
+                                    )
+                                    new_deck_id = cur.lastrowid
+
+                                    # Bulk insert every card entry; the generator feeds
+                                    # executemany row by row without building a list
+                                    rows = (
+                                        (new_deck_id, card.get("front", ""), card.get("back", ""),
+                                         None, 0, 0, 2.5, None)
+                                        for card in cards_list
+                                    )
+                                    conn.executemany(
+                                        """
+                                        INSERT INTO cards
+                                            (deck_id, front, back, next_review, interval, repetition, ef, extra_fields)
+                                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                                        """,
+                                        rows
+                                    )
+                                bump_db_version()
                             st.success(
                                 f"Deck '{imported_deck_name}' imported successfully!"
                             )
@@ -142,13 +149,11 @@ def import_notebook_dialog() -> None:
         if st.button("Import", key="import_notebook_button"):
             if imported_file is not None:
                 try:
-                    data = json.load(imported_file)
+                    data = json_helper.loads(imported_file.read())
                     imported_nb_name = data.get("name")
                     notes_list = data.get("notes", [])
 
                     if imported_nb_name:
-                        from utils.notes_db import c as notes_c, conn as notes_conn
-                        import sqlite3
                         try:
                             # Insert notebook record
                             notes_c.execute(
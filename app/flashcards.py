@@ -7,37 +7,115 @@ viewing and editing cards, spaced-repetition review workflows,
 and advanced field customization.
 """
 
-import json
+from datetime import datetime
+
+import pandas as pd
 import streamlit as st
 
+from cache import cached_get_decks
 from dialogs import import_deck_dialog
+from utils import json_helper
 from utils.flashcards_db import (
-    add_card, create_deck, delete_card, get_card_by_id, get_cards,
-    get_deck_stats, get_decks, rename_deck, reset_deck, trash_deck, update_card
+    CardRow, add_card, count_cards, create_deck, delete_card, get_all_deck_stats, get_card_by_id,
+    get_cards, get_cards_page, get_db_version, get_deck_name, get_deck_stats,
+    get_next_card_id, get_next_due_card_id, rename_deck, reset_deck, trash_deck, update_card
 )
 from utils.flashcards_sm2 import update_sm2, project_interval, format_interval_short
 
+# Rows shown per page in the deck detail card table
+CARDS_PAGE_SIZE = 50
+
+
+# Cached read helpers: `version` is the DB write counter, so any write
+# changes the cache key and the next rerun reads fresh rows.
+# Stats also expire after a minute since cards become due as time passes.
+@st.cache_data(show_spinner=False)
+def _cached_get_deck_name(version: int, deck_id: int) -> str | None:
+    """
+    Cached wrapper around get_deck_name.
+    """
+    return get_deck_name(deck_id)
+
+
+@st.cache_data(show_spinner=False, ttl=60)
+def _cached_get_all_deck_stats(version: int) -> dict[int, dict[str, int]]:
+    """
+    Cached wrapper around get_all_deck_stats.
+    """
+    return get_all_deck_stats()
+
+
+@st.cache_data(show_spinner=False, ttl=60)
+def _cached_get_deck_stats(version: int, deck_id: int) -> dict[str, int]:
+    """
+    Cached wrapper around get_deck_stats.
+    """
+    return get_deck_stats(deck_id)
+
+
+@st.cache_data(show_spinner=False)
+def _cached_get_cards(version: int, deck_id: int) -> list[tuple]:
+    """
+    Cached wrapper around get_cards.
+    """
+    return get_cards(deck_id)
+
+
+@st.cache_data(show_spinner=False)
+def _cached_get_cards_page(version: int, deck_id: int, limit: int, offset: int) -> list[tuple]:
+    """
+    Cached wrapper around get_cards_page.
+    """
+    return get_cards_page(deck_id, limit, offset)
+
+
+@st.cache_data(show_spinner=False)
+def _cached_count_cards(version: int, deck_id: int) -> int:
+    """
+    Cached wrapper around count_cards.
+    """
+    return count_cards(deck_id)
+
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def _cached_get_card_by_id(version: int, card_id: int) -> CardRow | None:
+    """
+    Cached wrapper around get_card_by_id.
+    """
+    return get_card_by_id(card_id)
+
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def _cached_projections(version: int, card_id: int) -> tuple[str, str, str, str] | None:
+    """
+    Formatted projected intervals for the Again/Hard/Medium/Easy grades of a card.
+    """
+    card = get_card_by_id(card_id)
+    if not card:
+        return None
+    return tuple(format_interval_short(project_interval(card, q)) for q in (0, 3, 4, 5))
+
 
 def render_decks_section() -> None:
     """
     Display and edit the list of flashcard decks using a data_editor.
     Users can add, rename, select decks, and perform import/export/delete actions.
     """
-    import pandas as pd
-
     # Section header
     st.markdown("<h2 style='text-align:center;'>Flashcard Decks</h2>", unsafe_allow_html=True)
 
     # Fetch raw deck data
-    decks_raw = get_decks()
+    decks_raw = cached_get_decks(get_db_version())
     if decks_raw:
-        # Build DataFrame including stats for each deck
+        # Build DataFrame including stats for each deck (one grouped query)
+        all_stats = _cached_get_all_deck_stats(get_db_version())
+        empty_stats = {"new": 0, "learn": 0, "due": 0}
         df_orig = pd.DataFrame([
             {
                 "id": d_id,
                 "Select": False,
                 "Deck": d_name,
-                **get_deck_stats(d_id)  # live 'new', 'learn', 'due' counts
+                **all_stats.get(d_id, empty_stats)  # live 'new', 'learn', 'due' counts
             }
             for d_id, d_name in decks_raw
         ])
@@ -145,31 +223,40 @@ def render_decks_section() -> None:
         ):
             import_deck_dialog()
 
-        # Export button: download deck JSON if selected
-        if sel_deck_id is not None:
-            deck_json = json.dumps(
-                {
-                    "name": sel_deck_name,
-                    "cards": [
-                        {"front": c[1], "back": c[2]} for c in get_cards(sel_deck_id)
-                    ]
-                }, indent=2
-            )
+        # Export button: serialize the deck only when asked, then offer the download.
+        # The prepared export is tied to the deck and DB version it was built from.
+        export = st.session_state.get("deck_export")
+        export_ready = (
+            sel_deck_id is not None
+            and export is not None
+            and export[:2] == (sel_deck_id, get_db_version())
+        )
+        if export_ready:
             col_export.download_button(
-                label="", data=deck_json,
+                label="", data=export[2],
                 file_name=f"{sel_deck_name}.json",
                 mime="application/json",
                 key=f"download_deck_{sel_deck_id}",
                 type="secondary", icon=":material/download:",
                 use_container_width=True
             )
-        else:
-            col_export.button(
-                "", disabled=True,
-                key="deck_export_btn_disabled",
-                type="secondary", icon=":material/download:",
-                use_container_width=True
+        elif col_export.button(
+            "", key="deck_export_btn",
+            type="secondary", icon=":material/file_export:",
+            use_container_width=True,
+            disabled=sel_deck_id is None
+        ):
+            deck_json = json_helper.dumpb(
+                {
+                    "name": sel_deck_name,
+                    "cards": [
+                        {"front": c[1], "back": c[2]}
+                        for c in _cached_get_cards(get_db_version(), sel_deck_id)
+                    ]
+                }, indent=True
             )
+            st.session_state.deck_export = (sel_deck_id, get_db_version(), deck_json)
+            st.rerun()
 
         # Delete button: mark deck pending deletion
         if col_delete.button(
@@ -206,17 +293,12 @@ def render_deck_detail(deck_id: int) -> None:
     Show card list for a specific deck in either browse or edit mode.
     Allow inline editing, addition, deletion, and SM-2 reset.
     """
-    import pandas as pd
-    from utils.flashcards_db import c
-
-    # Load deck name from DB
-    c.execute("SELECT name FROM decks WHERE id = ?", (deck_id,))
-    row = c.fetchone()
-    if not row:
+    # Load deck name (cached until the next DB write)
+    deck_name = _cached_get_deck_name(get_db_version(), deck_id)
+    if deck_name is None:
         st.error("Deck not found.")
         st.session_state.update(selected_deck_id=None, selected_deck_mode=None)
         return
-    deck_name = row[0]
 
     if deck_id not in st.session_state.deck_fields:
         st.session_state.deck_fields[deck_id] = ["Front", "Back"]
@@ -254,15 +336,32 @@ def render_deck_detail(deck_id: int) -> None:
     st.text("")
     st.text("")
 
-    # Fetch cards for this deck
-    cards_raw = get_cards(deck_id)
-    if not cards_raw:
+    render_deck_cards(deck_id)
+
+
+@st.fragment
+def render_deck_cards(deck_id: int) -> None:
+    """
+    Card table, action buttons, and preview/form for one deck.
+    Runs as a fragment so selecting a card or toggling edit/stats reruns only this block;
+    writes still trigger a full rerun so deck-level views pick up the change.
+    """
+    # Fetch only the current page of cards for this deck
+    total = _cached_count_cards(get_db_version(), deck_id)
+    if not total:
         st.info("No cards yet.")
         return
+    n_pages = -(-total // CARDS_PAGE_SIZE)
+    page = min(st.session_state.deck_cards_page.get(deck_id, 0), n_pages - 1)
+    cards_raw = _cached_get_cards_page(
+        get_db_version(), deck_id, CARDS_PAGE_SIZE, page * CARDS_PAGE_SIZE
+    )
 
+    # Index rows by id so preview and stats need no further queries
+    cards_by_id = {row[0]: row for row in cards_raw}
     df_cards = pd.DataFrame([
         {"id": cid, "Front": f, "Back": b}
-        for cid, f, b in cards_raw
+        for cid, f, b, *_ in cards_raw
     ])
 
     # Show it as a single‐row selectable table
@@ -271,11 +370,24 @@ def render_deck_detail(deck_id: int) -> None:
         df_cards,
         use_container_width=True,
         hide_index=True,
-        key=f"cards_df_{deck_id}",
+        key=f"cards_df_{deck_id}_{page}",
         on_select="rerun",
         selection_mode="single-row"
     )
 
+    # Pager: only shown once the deck outgrows a single page
+    if n_pages > 1:
+        pcols = st.columns([1, 2, 1])
+        if pcols[0].button("", disabled=page == 0, icon=":material/chevron_left:", use_container_width=True):
+            st.session_state.deck_cards_page[deck_id] = page - 1
+            st.rerun(scope="fragment")
+        pcols[1].markdown(
+            f"<p style='text-align:center;'>Page {page + 1} of {n_pages}</p>", unsafe_allow_html=True
+        )
+        if pcols[2].button("", disabled=page >= n_pages - 1, icon=":material/chevron_right:", use_container_width=True):
+            st.session_state.deck_cards_page[deck_id] = page + 1
+            st.rerun(scope="fragment")
+
     # Pull out which row is selected (state.selection.rows is a list of indices)
     selected_indices = state.selection.rows
     sel_id = None
@@ -294,20 +406,22 @@ def render_deck_detail(deck_id: int) -> None:
         cur = st.session_state.get("add_new_card")
         st.session_state.add_new_card = False if cur == True else True
         st.session_state.selected_card_id = None
-        st.rerun()
+        st.rerun(scope="fragment")
     if bcols[1].button("", disabled=sel_id is None, type="secondary", icon=":material/edit:", use_container_width=True):
         cur = st.session_state.get("selected_card_id")
         st.session_state.selected_card_id = None if cur == sel_id else sel_id
         st.session_state.add_new_card = False
-        st.rerun()
+        st.rerun(scope="fragment")
     if bcols[2].button("", disabled=sel_id is None, type="secondary", icon=":material/query_stats:", use_container_width=True):
         cur = st.session_state.get("selected_stats_card_id")
         st.session_state.selected_stats_card_id = None if cur == sel_id else sel_id
         st.session_state.add_new_card = False
-        st.rerun()
+        st.rerun(scope="fragment")
     if bcols[3].button("", disabled=sel_id is None, type="secondary", icon=":material/close:", use_container_width=True):
-        delete_card(sel_id)
-        st.success("Deleted.")
+        if delete_card(sel_id) is None:
+            st.error("Card not found.")
+        else:
+            st.success("Deleted.")
         st.rerun()
 
     # Spacing
@@ -323,7 +437,7 @@ def render_deck_detail(deck_id: int) -> None:
     
     # Edit mode: populate form with existing card data
     if st.session_state.get("selected_card_id"):
-        cd = get_card_by_id(st.session_state.selected_card_id)
+        cd = _cached_get_card_by_id(get_db_version(), st.session_state.selected_card_id)
         if cd:
             render_card_form(deck_id, editing=True, card_data=cd)
         return
@@ -331,15 +445,14 @@ def render_deck_detail(deck_id: int) -> None:
     # Preview mode: display selected card visually
     if sel_id:
         with st.container(border=True):
-            card = get_card_by_id(sel_id)
+            card = cards_by_id.get(sel_id)
             if card:
-                _, _, ftxt, btxt, *_ = card
+                _, ftxt, btxt, nr, interval, rep, ef = card
                 render_card_visual(ftxt, btxt, show_back=True)
 
                 # Show SM-2 stats if toggled
                 if st.session_state.get("selected_stats_card_id") == sel_id:
-                    _, _, _, _, nr, interval, rep, ef, _ = card
-                    nr_str = nr.split("T")[0] if nr else "—"
+                    nr_str = datetime.fromtimestamp(nr).date().isoformat() if nr else "—"
 
                     st.text("")
                     st.text("")
@@ -356,24 +469,23 @@ def render_deck_detail(deck_id: int) -> None:
         st.markdown("<h3 style='text-align:center;'>Select a card to preview.</h3>", unsafe_allow_html=True)
 
 
+@st.fragment
 def render_deck_review(deck_id: int) -> None:
     """
     Conduct a spaced-repetition review session for a deck.
     Displays cards one-by-one, handles answer reveal, grading, and scheduling.
+    Runs as a fragment: revealing and grading rerun only the review panel,
+    while leaving the session reruns the whole app to route back to the dashboard.
     """
-    from utils.flashcards_db import c
-
     st.markdown(f"<h2 style='text-align:center;'>Flashcard Review</h2>", unsafe_allow_html=True)
 
     with st.container(border=True):
         # Load deck name or abort
-        c.execute("SELECT name FROM decks WHERE id = ?", (deck_id,))
-        row = c.fetchone()
-        if not row:
+        deck_name = _cached_get_deck_name(get_db_version(), deck_id)
+        if deck_name is None:
             st.error("This deck does not exist.")
             st.session_state.selected_deck_id = None
             return
-        deck_name = row[0]
 
         # Top row: Back button and deck title with stats
         top_row = st.columns([1,1,1,1])
@@ -392,7 +504,7 @@ def render_deck_review(deck_id: int) -> None:
         st.text("")
 
         stats_row = st.columns([1,1,1])
-        stats = get_deck_stats(deck_id)
+        stats = _cached_get_deck_stats(get_db_version(), deck_id)
         stats_row[0].markdown(f"<p style='text-align:center; color:lime'>New: {stats['new']}</p>", unsafe_allow_html=True)
         stats_row[1].markdown(f"<p style='text-align:center; color:yellow'>Learn: {stats['learn']}</p>", unsafe_allow_html=True)
         stats_row[2].markdown(f"<p style='text-align:center; color:red'>Due: {stats['due']}</p>", unsafe_allow_html=True)
@@ -403,25 +515,24 @@ def render_deck_review(deck_id: int) -> None:
             return
 
         st.divider()
-        cards_data = get_cards(deck_id)
-        if not cards_data:
-            st.info("No cards to review.")
-            return
 
-        # Initialize current card if not set
+        # Initialize current card with the most overdue (or new) card
+        if st.session_state.review_card_id is None:
+            st.session_state.review_card_id = get_next_due_card_id(deck_id)
         if st.session_state.review_card_id is None:
-            st.session_state.review_card_id = cards_data[0][0]
+            st.info("No cards to review.")
+            return
 
         # Load the current card record
-        card = get_card_by_id(st.session_state.review_card_id)
+        card = _cached_get_card_by_id(get_db_version(), st.session_state.review_card_id)
         if not card:
             st.error("Selected card not found.")
             return
 
-        (card_id, _, front, back, next_rev, interval, repetition, ef, extra_json) = card
+        card_id = card.id
 
         # Display card front/back and extras
-        render_card_visual(front, back, show_back=st.session_state.review_show_answer)
+        render_card_visual(card.front, card.back, show_back=st.session_state.review_show_answer)
 
         # Show answer or grading buttons based on state
         st.text("")
@@ -429,13 +540,12 @@ def render_deck_review(deck_id: int) -> None:
         if not st.session_state.review_show_answer:
             if st.button("Show Answer", key="show_answer_btn", use_container_width=True):
                 st.session_state.review_show_answer = True
-                st.rerun()
+                st.rerun(scope="fragment")
         else:
-            # Compute projected intervals for each grade
-            proj_again = format_interval_short(project_interval(card, 0))
-            proj_hard  = format_interval_short(project_interval(card, 3))
-            proj_medium  = format_interval_short(project_interval(card, 4))
-            proj_easy  = format_interval_short(project_interval(card, 5))
+            # Projected intervals for each grade, computed once per card version
+            proj_again, proj_hard, proj_medium, proj_easy = _cached_projections(
+                get_db_version(), card_id
+            )
 
             st.text("")
             st.text("")
@@ -467,20 +577,19 @@ def render_deck_review(deck_id: int) -> None:
 
 def go_to_next_card(deck_id: int) -> None:
     """
-    Advance review to the next card in the deck, cycling back if at end.
-    Resets answer visibility and edit mode.
+    Advance review to the next due card, or cycle to the following card
+    in the deck if none is due. Resets answer visibility and edit mode.
+    Only called from the review fragment, so only that fragment reruns.
     """
-    cards_data = get_cards(deck_id)
-    if not cards_data:
+    next_id = get_next_due_card_id(deck_id)
+    if next_id is None:
+        next_id = get_next_card_id(deck_id, st.session_state.review_card_id)
+    if next_id is None:
         return
-    ids = [c[0] for c in cards_data]
-    cur = st.session_state.review_card_id
-    if cur in ids:
-        idx = ids.index(cur)
-        st.session_state.review_card_id = ids[(idx + 1) % len(ids)]
-        st.session_state.review_show_answer = False
-        st.session_state.review_edit_mode = False
-    st.rerun()
+    st.session_state.review_card_id = next_id
+    st.session_state.review_show_answer = False
+    st.session_state.review_edit_mode = False
+    st.rerun(scope="fragment")
 
 
 def render_card_visual(front: str, back: str, show_back: bool=False) -> None:
@@ -516,11 +625,7 @@ def render_card_form(deck_id: int, editing: bool=False, card_data=None, allow_im
 
     # Load existing card data into form values when editing
     if editing and card_data:
-        db_front, db_back, extra_json = card_data[2], card_data[3], card_data[8]
-        try:
-            extra_data = json.loads(extra_json) if extra_json else {}
-        except json.JSONDecodeError:
-            extra_data = {}
+        db_front, db_back = card_data.front, card_data.back
         for field in st.session_state.deck_fields[deck_id]:
             if field == "Front":
                 st.session_state.card_form_values[deck_id][field] = db_front
@@ -578,9 +683,11 @@ def render_card_form(deck_id: int, editing: bool=False, card_data=None, allow_im
             if front_val.strip() and back_val.strip():
                 # Collect extra field data
                 if editing and card_data:
-                    card_id = card_data[0]
-                    update_card(card_id, front_val.strip(), back_val.strip())
-                    st.success("Flashcard updated!")
+                    card_id = card_data.id
+                    if update_card(card_id, front_val.strip(), back_val.strip()) is None:
+                        st.error("Flashcard no longer exists.")
+                    else:
+                        st.success("Flashcard updated!")
                     st.session_state.selected_card_id = None
                 else:
                     add_card(deck_id, front_val.strip(), back_val.strip())
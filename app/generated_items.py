@@ -8,10 +8,14 @@ Includes import, regeneration, and deletion workflows integrated with database u
 import re
 import streamlit as st
 
-from utils.flashcards_db import add_card
+from utils.flashcards_db import add_card, add_cards
 from utils.notes_db import create_note
 from utils.file_helper import FileHelper
 
+# Graphviz detection patterns, compiled once since notes are scanned on every rerun
+_GRAPHVIZ_FENCE_RE = re.compile(r"```(?:graphviz|dot)\s+([\s\S]+?)```", re.IGNORECASE)
+_RAW_DOT_RE = re.compile(r"^(strict\s+)?(di)?graph\b", re.IGNORECASE)
+
 
 def render_generated_items_window() -> None:
     """
@@ -92,9 +96,9 @@ def _render_generated_flashcards_section() -> None:
     # Action buttons: import or clear all
     col_a, col_b = st.columns(2)
     if col_a.button("Add All Flashcards", use_container_width=True):
+        pairs = [(card.front, card.back) for card in st.session_state.generated_cards]
         for deck_id in target_ids:
-            for card in st.session_state.generated_cards:
-                add_card(deck_id, card.front, card.back, extra_fields=None)
+            add_cards(deck_id, pairs)
         st.success("Imported all flashcards!")
         st.session_state.generated_cards = []
         st.rerun()
@@ -239,13 +243,13 @@ def _extract_graphviz(content: str) -> str | None:
     or appears to be raw DOT text.
     """
     # Look for fenced graphviz or dot block
-    match = re.search(r"```(?:graphviz|dot)\s+([\s\S]+?)```", content, re.IGNORECASE)
+    match = _GRAPHVIZ_FENCE_RE.search(content)
     if match:
         return match.group(1).strip()
 
     # Fallback: content starting with graph or digraph keywords
     stripped = content.strip()
-    if re.match(r"^(strict\s+)?(di)?graph\b", stripped, re.IGNORECASE):
+    if _RAW_DOT_RE.match(stripped):
         return stripped
 
     # No Graphviz code detected
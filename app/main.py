@@ -34,6 +34,7 @@ def init_session_state() -> None:
     state.setdefault("selected_deck_mode", None) # "browse" or "review"
     state.setdefault("deck_pending_delete", None)
     state.setdefault("deck_pending_reset", None)
+    state.setdefault("deck_export", None) # (deck_id, db_version, json bytes) prepared for download
     state.setdefault("review_card_id", None)
     state.setdefault("review_show_answer", False)
     state.setdefault("review_edit_mode", False)
@@ -42,6 +43,7 @@ def init_session_state() -> None:
     state.setdefault("view_show_answer", False)
     state.setdefault("selected_card_id", None)
     state.setdefault("deck_fields", {}) # custom field definitions per deck
+    state.setdefault("deck_cards_page", {}) # current card table page per deck
 
     # Notebooks: selection, deletion, and editing flags
     state.setdefault("selected_notebook_id", None)
@@ -6,10 +6,10 @@ Includes listing, creating, renaming, deleting notebooks and notes,
 detailed note editing, preview, and spaced-repetition review workflows.
 """
 
-import json
 import streamlit as st
 
 from generated_items import _extract_graphviz
+from utils import json_helper
 from utils.notes_db import (
     get_notebooks, create_notebook, delete_notebook, rename_notebook,
     get_notes, create_note, update_note, rename_note, delete_note,
@@ -152,13 +152,13 @@ def render_notebooks_section() -> None:
 
         # Excport button (JSON download) if selection exists
         if sel_nb_id is not None:
-            nb_json = json.dumps(
+            nb_json = json_helper.dumpb(
                 {
                     "name": sel_nb_name,
                     "notes": [
                         {"note_name": n[1], "content": n[2]} for n in get_notes(sel_nb_id)
                     ],
-                }, indent=2
+                }, indent=True
             )
             btn_cols[3].download_button(
                 label="", data=nb_json,
@@ -6,17 +6,42 @@ Provides functions to render study-material generation options, process user inp
 and integrate with file handling and OpenAI services.
 """
 
+import io
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 import streamlit as st
 from typing import List
 from openai import OpenAI
 
-from utils.flashcards_db import get_decks
+from cache import cached_get_decks
+from utils.flashcards_db import get_db_version
 from utils.notes_db import get_notebooks
 from utils.file_helper import FileHelper
 
 
+@st.cache_resource(show_spinner=False)
+def _get_file_helper() -> FileHelper:
+    """
+    Shared FileHelper for the generation sidebar. It holds no per-session
+    state, so one instance (and one media-dir check) serves every rerun.
+    """
+    return FileHelper()
+
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def _count_pdf_pages(pdf_bytes: bytes) -> int:
+    """
+    Count the pages of an uploaded PDF, cached on its content so reruns
+    with the same upload skip re-parsing. Returns 0 if parsing fails.
+    """
+    try:
+        from PyPDF2 import PdfReader
+        return len(PdfReader(io.BytesIO(pdf_bytes)).pages)
+    except Exception:
+        return 0
+
+
 def render_generation_sidebar() -> None:
     """
     Render the study-material generation interface in the Streamlit sidebar.
@@ -41,17 +66,18 @@ def render_generation_sidebar() -> None:
 
             # If flashcards selected, allow deck selection
             if "Flashcards" in study_types:
-                decks = get_decks()
+                decks = cached_get_decks(get_db_version())
                 if not decks:
                     st.error("No decks available. Please create a deck first.")
                     return
                 
                 # Map deck names to their IDs for multi-select
                 deck_opts = {dname: did for did, dname in decks}
+                deck_names = list(deck_opts)
                 selected_names = st.multiselect(
                     "Target deck(s)",
-                    options=list(deck_opts.keys()),
-                    default=list(deck_opts.keys())[:1],
+                    options=deck_names,
+                    default=deck_names[:1],
                     key="gen_deck_select",
                 )
 
@@ -75,10 +101,11 @@ def render_generation_sidebar() -> None:
                 
                 # Map notebook names to their IDs for multi-select
                 nb_opts = {nname: nid for nid, nname in notebooks}
+                nb_names = list(nb_opts)
                 selected_nb_names = st.multiselect(
                     "Target notebook(s)",
-                    options=list(nb_opts.keys()),
-                    default=list(nb_opts.keys())[:1],
+                    options=nb_names,
+                    default=nb_names[:1],
                     key="gen_nb_select",
                 )
 
@@ -91,7 +118,7 @@ def render_generation_sidebar() -> None:
                 st.session_state.pop("gen_target_nb_ids", None)
 
             # Initialize file helper for processing inputs
-            file_helper = FileHelper()
+            file_helper = _get_file_helper()
 
             # File upload widget for text, PDF, or images
             uploaded_file = st.file_uploader(
@@ -104,15 +131,7 @@ def render_generation_sidebar() -> None:
 
             # If uploaded file is a PDF, show page-range selectors
             if uploaded_file is not None and uploaded_file.name.lower().endswith(".pdf"):
-                try:
-                    from PyPDF2 import PdfReader
-                    uploaded_file.seek(0)
-                    pdf_reader = PdfReader(uploaded_file)
-                    total_pages = len(pdf_reader.pages)
-                    uploaded_file.seek(0)
-                except Exception:
-                    # Default to zero pages if PDF parsing fails
-                    total_pages = 0
+                total_pages = _count_pdf_pages(uploaded_file.getvalue())
 
                 # Two columns for start and end page inputs
                 sc1, sc2 = st.columns(2)
@@ -132,18 +151,30 @@ def render_generation_sidebar() -> None:
                 )
                 page_range = (start_page, end_page)
 
-            # Text area for pasting plain content
-            text_input = st.text_area(
-                "Or paste text content here", "", key="gen_text_input"
-            )
+            # Text and URL inputs sit in a form so editing them does not rerun the app;
+            # the uploader stays outside so the PDF page range can react to it
+            with st.form("gen_form", border=False):
+                # Text area for pasting plain content
+                text_input = st.text_area(
+                    "Or paste text content here", "", key="gen_text_input"
+                )
 
-            # URL input for scraping remote content
-            url_input = st.text_input(
-                "Or provide a URL", "", key="gen_url_input"
-            )
+                # URL input for scraping remote content
+                url_input = st.text_input(
+                    "Or provide a URL", "", key="gen_url_input"
+                )
 
-            # Generate button to trigger content processing
-            if st.button("", key="gen_button", type="secondary", icon=":material/send:", use_container_width=True):
+                # Turn off to regenerate text that was already processed in the last day
+                use_cache = st.checkbox(
+                    "Reuse cached responses", value=True, key="gen_use_cache"
+                )
+
+                # Generate button to trigger content processing
+                submitted = st.form_submit_button(
+                    "", type="secondary", icon=":material/send:", use_container_width=True
+                )
+
+            if submitted:
                 final_text = ""
 
                 # Prioritize uploaded file processing
@@ -168,11 +199,29 @@ def render_generation_sidebar() -> None:
                     st.warning("No valid content provided!")
                     return
 
-                # Run flashcard generation pipeline if selected
-                if "Flashcards" in study_types:
-                    flashcard_models = file_helper.generate_flashcards_pipeline(
-                        final_text
+                # Start the selected generation pipelines concurrently: each is an
+                # independent chain of LLM calls, so the wait is the slowest one, not the sum
+                with ThreadPoolExecutor(max_workers=3) as pool:
+                    flashcards_job = (
+                        pool.submit(
+                            file_helper.generate_flashcards_pipeline, final_text, use_cache=use_cache
+                        )
+                        if "Flashcards" in study_types else None
                     )
+                    notes_job = (
+                        pool.submit(
+                            file_helper.generate_notes_pipeline, final_text, use_cache=use_cache
+                        )
+                        if "Notebooks" in study_types else None
+                    )
+                    graphs_job = (
+                        pool.submit(file_helper.generate_graphs_pipeline, final_text, "mind_map")
+                        if "Mind Maps" in study_types else None
+                    )
+
+                # Run flashcard generation pipeline if selected
+                if flashcards_job is not None:
+                    flashcard_models = flashcards_job.result()
                     # Collect all generated flashcards into session
                     st.session_state.generated_cards = [
                         fc
@@ -185,8 +234,8 @@ def render_generation_sidebar() -> None:
                     st.session_state.pop("generated_cards", None)
 
                 # Run notes generation pipeline if selected
-                if "Notebooks" in study_types:
-                    note_models = file_helper.generate_notes_pipeline(final_text)
+                if notes_job is not None:
+                    note_models = notes_job.result()
                     st.session_state.generated_notes = [
                         nt for m in note_models if hasattr(m, "notes") for nt in m.notes
                     ]
@@ -195,13 +244,11 @@ def render_generation_sidebar() -> None:
 
                 # Run mind map (graph) generation pipeline if selected
                 graph_models: List[dict] = []
-                if "Mind Maps" in study_types:
+                if graphs_job is not None:
                     graph_models.extend(
                         [
                             {"item": g, "type": "mind_map"}
-                            for g in file_helper.generate_graphs_pipeline(
-                                final_text, "mind_map"
-                            )
+                            for g in graphs_job.result()
                         ]
                     )
 
@@ -12,17 +12,31 @@ import io
 import json
 import base64
 import re
+from types import MappingProxyType
 from typing import List
 
 from PIL import Image
 from rich.console import Console
 from pdf2image import convert_from_path
 
+try:
+    import pybase64
+except ImportError:
+    # pybase64 is an optional SIMD-accelerated encoder; stdlib base64 is equivalent
+    pybase64 = None
+
 from utils.model_helper import ModelHelper
 from utils.logger import logger
 from utils.scraper import process_url as scrape_process_url
 from utils import model_schemas
 
+# Opening fence of a graphviz/dot code block in generated graph content
+_GRAPHVIZ_FENCE_RE = re.compile(r"```(?:graphviz|dot)\s", re.IGNORECASE)
+
+# Chunks each generation pipeline sends at once; the shared rate limiter still
+# paces the requests, so this only overlaps their network wait
+PIPELINE_MAX_CONCURRENCY = 4
+
 
 class FileHelper:
     """
@@ -41,8 +55,8 @@ class FileHelper:
     # Shared console for logging to terminal
     console = Console()
 
-    # Map file extensions to abstract content types
-    EXTENSION_CONTENT_TYPE_MAP = {
+    # Map file extensions to abstract content types (read-only)
+    EXTENSION_CONTENT_TYPE_MAP = MappingProxyType({
         '.txt': 'text',
         '.pdf': 'pdf',
         '.json': 'json',
@@ -51,12 +65,12 @@ class FileHelper:
         '.jpeg': 'image',
         '.gif': 'image',
         '.bmp': 'image',
-    }
+    })
 
     def __init__(self):
         """
         Initialize FileHelper, creating a media directory two levels up.
-        Allowed_extensions lists the keys from EXTENSION_CONTENT_TYPE_MAP.
+        Allowed_extensions is a frozenset of the keys from EXTENSION_CONTENT_TYPE_MAP.
         """
         # Determine media folder location relative to this file
         self.media_dir = os.path.join(
@@ -64,8 +78,8 @@ class FileHelper:
             "..", "..", "media"
         )
 
-        # List of permitted file extensions
-        self.allowed_extensions = list(FileHelper.EXTENSION_CONTENT_TYPE_MAP.keys())
+        # Set of permitted file extensions for O(1) membership tests
+        self.allowed_extensions = frozenset(FileHelper.EXTENSION_CONTENT_TYPE_MAP)
 
         # Ensure media directory exists
         os.makedirs(self.media_dir, exist_ok=True)
@@ -112,8 +126,9 @@ class FileHelper:
         if url:
             return 'url'
         if file_path:
-            _, ext = os.path.splitext(file_path)
-            return cls.EXTENSION_CONTENT_TYPE_MAP.get(ext.lower(), 'unsupported')
+            # Only the suffix is lowercased; the map lookup is a single hash probe
+            ext = os.path.splitext(file_path)[1].lower()
+            return cls.EXTENSION_CONTENT_TYPE_MAP.get(ext, 'unsupported')
         return 'unsupported'
 
     def process_file(
@@ -128,8 +143,7 @@ class FileHelper:
         Copies the original file into media_dir for storage.
         """
         filename = uploaded_file.name
-        _, ext = os.path.splitext(filename)
-        content_type = self.EXTENSION_CONTENT_TYPE_MAP.get(ext.lower(), 'unsupported')
+        content_type = self.get_content_type(filename)
 
         if content_type == 'unsupported':
             logger.warning("Unsupported file type: %s. Skipping.", filename)
@@ -218,20 +232,38 @@ class FileHelper:
     @staticmethod
     def _get_image(path: str) -> List[Image.Image]:
         """
-        Convert PDF path to list of PIL Images using pdf2image.
+        Rasterize only the first page of a PDF path using pdf2image.
+        Returns a list with at most one PIL Image.
         """
-        return convert_from_path(path)
+        return convert_from_path(path, first_page=1, last_page=1)
 
     @staticmethod
-    def _get_img_uri(img: Image.Image) -> str:
+    def _get_img_uri(img: Image.Image, image_format: str = 'PNG', quality: int | None = None) -> str:
         """
-        Encode a PIL Image as a base64 data URI (PNG format).
+        Encode a PIL Image as a base64 data URI (PNG by default).
+        Pass image_format='JPEG' with a quality for smaller, lossy page renders.
         """
         buffer = io.BytesIO()
-        img.save(buffer, format='PNG')
-        buffer.seek(0)
-        b64 = base64.b64encode(buffer.read()).decode('utf-8')
-        return f"data:image/png;base64,{b64}"
+        save_kwargs = {"quality": quality} if quality is not None else {}
+        img.save(buffer, format=image_format, **save_kwargs)
+
+        # Encode straight from the buffer's memory instead of copying it out first
+        data = buffer.getbuffer()
+        if pybase64 is not None:
+            b64 = pybase64.b64encode_as_string(data)
+        else:
+            b64 = base64.b64encode(data).decode('ascii')
+        return f"data:image/{image_format.lower()};base64,{b64}"
+
+    @staticmethod
+    def _get_pdf_preview_uri(path: str) -> str:
+        """
+        Render the first page of a PDF as a JPEG data URI, or "" if it has no pages.
+        """
+        pages = FileHelper._get_image(path)
+        if not pages:
+            return ""
+        return FileHelper._get_img_uri(pages[0].convert('RGB'), image_format='JPEG', quality=80)
 
     @staticmethod
     def _get_plain_text(file_path: str) -> str:
@@ -320,18 +352,28 @@ class FileHelper:
         note = model_schemas.NoteItem.model_validate_json(response)
 
         # Wrap raw content in graphviz block if missing
-        if not re.search(r"```(?:graphviz|dot)\s", note.content, re.IGNORECASE):
+        if not _GRAPHVIZ_FENCE_RE.search(note.content):
             note.content = f"```graphviz\n{note.content.strip()}\n```"
         return note
 
-    def generate_flashcards_pipeline(self, text: str, flashcard_type='general') -> List[model_schemas.Flashcard]:
+    def generate_flashcards_pipeline(
+        self,
+        text: str,
+        flashcard_type='general',
+        use_cache: bool = True
+    ) -> List[model_schemas.Flashcard]:
         """
         High-level entry for generating flashcards from text or image data URI.
         Writes to temp file for text inputs or uses direct chunk if image.
         Cleans up temp files afterward.
+        use_cache=False bypasses cached responses for a fresh generation.
         """
         from utils.model_pipeline import ModelPipeline
-        pipeline = ModelPipeline(media_dir=self.get_media_path())
+        pipeline = ModelPipeline(
+            media_dir=self.get_media_path(),
+            max_concurrency=PIPELINE_MAX_CONCURRENCY,
+            use_cache=use_cache
+        )
         
         # Image data URI path
         if text.startswith("data:image"):
@@ -357,13 +399,17 @@ class FileHelper:
             os.remove(tmp)
         return models
 
-    def generate_notes_pipeline(self, text: str) -> List[model_schemas.Note]:
+    def generate_notes_pipeline(self, text: str, use_cache: bool = True) -> List[model_schemas.Note]:
         """
         High-level entry for generating structured notes from text or image data URI.
         Similar to flashcards pipeline but triggers note-specific flows.
         """
         from utils.model_pipeline import ModelPipeline
-        pipeline = ModelPipeline(media_dir=self.get_media_path())
+        pipeline = ModelPipeline(
+            media_dir=self.get_media_path(),
+            max_concurrency=PIPELINE_MAX_CONCURRENCY,
+            use_cache=use_cache
+        )
 
         if text.startswith("data:image"):
             chunks = [{"title": "Uploaded Image", "content": text}]
@@ -421,7 +467,7 @@ class FileHelper:
 
         # Wrap raw graph content in code fences if needed
         note = model_schemas.NoteItem.model_validate_json(response)
-        if not re.search(r"```(?:graphviz|dot)\s", note.content, re.IGNORECASE):
+        if not _GRAPHVIZ_FENCE_RE.search(note.content):
             note.content = f"```graphviz\n{note.content.strip()}\n```"
 
         return [note]
@@ -430,7 +476,6 @@ class FileHelper:
     READ_DISPATCH = {
         'text': _get_plain_text,
         'image': lambda path: FileHelper._get_img_uri(Image.open(path)),
-        'pdf': lambda path: FileHelper._get_img_uri(FileHelper._get_image(path)[0])
-            if FileHelper._get_image(path) else "",
+        'pdf': lambda path: FileHelper._get_pdf_preview_uri(path),
     }
     
\ No newline at end of file
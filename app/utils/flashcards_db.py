@@ -8,72 +8,234 @@ plus utilities for resetting schedules and gathering statistics for spaced repet
 
 import sqlite3
 import os
+import threading
+import time
+from collections import namedtuple
 from datetime import datetime
 
+from utils import json_helper
+from utils.logger import logger
+
 # Define database file path in current working directory
 DB_PATH = os.path.join(os.getcwd(), "flashcards.db")
 
-# Establish a SQLite connection and cursor for global use
-conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+# Establish a SQLite connection for global use; the cursor only runs the import-time PRAGMAs
+# A larger statement cache keeps the hot-path queries below prepared across reruns
+conn = sqlite3.connect(DB_PATH, check_same_thread=False, cached_statements=512)
 c = conn.cursor()
 
+# Streamlit serves each session on its own thread, all sharing this connection;
+# every query gets its own cursor via conn.execute so result sets never mix, and
+# writers hold this lock so statements and commits never interleave
+db_lock = threading.Lock()
+
+# Hot-path SQL kept as module constants so every call reuses the cached statement
+_SQL_GET_DECKS = "SELECT id, name FROM decks"
+_SQL_GET_DECK_NAME = "SELECT name FROM decks WHERE id = ?"
+_SQL_GET_CARDS = (
+    "SELECT id, front, back, next_review, interval, repetition, ef"
+    " FROM cards WHERE deck_id = ? ORDER BY id"
+)
+_SQL_GET_CARDS_PAGE = _SQL_GET_CARDS + " LIMIT ? OFFSET ?"
+_SQL_COUNT_CARDS = "SELECT COUNT(*) FROM cards WHERE deck_id = ?"
+_SQL_GET_CARD_BY_ID = (
+    "SELECT id, deck_id, front, back, next_review, interval, repetition, ef, extra_fields"
+    " FROM cards WHERE id = ?"
+)
+_SQL_NEXT_CARD_ID = "SELECT id FROM cards WHERE deck_id = ? AND id > ? ORDER BY id LIMIT 1"
+_SQL_FIRST_CARD_ID = "SELECT MIN(id) FROM cards WHERE deck_id = ?"
+_SQL_NEXT_DUE_CARD_ID = """
+    SELECT id FROM cards
+     WHERE deck_id = ?
+       AND (repetition = 0 OR next_review IS NULL OR next_review <= ?)
+     ORDER BY next_review IS NULL DESC, next_review ASC
+     LIMIT 1
+"""
+_SQL_INSERT_CARD = """
+    INSERT INTO cards
+        (deck_id, front, back, next_review, interval, repetition, ef, extra_fields)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# Column definitions for the cards table, shared by init_db and the cascade migration;
+# deleting a deck cascades to its cards
+_CARDS_TABLE_COLUMNS = """
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    deck_id INTEGER,
+    front TEXT,
+    back TEXT,
+    next_review INTEGER, -- Unix epoch seconds or NULL
+    interval REAL,
+    repetition INTEGER,
+    ef REAL,
+    extra_fields TEXT,
+    FOREIGN KEY(deck_id) REFERENCES decks(id) ON DELETE CASCADE
+"""
+
+# Full card row with named fields; a module-level namedtuple so rows stay
+# picklable for st.cache_data (sqlite3.Row is not)
+CardRow = namedtuple(
+    "CardRow",
+    "id deck_id front back next_review interval repetition ef extra_fields"
+)
+
+# Monotonic write counter; the UI passes it to cached readers as part of the key.
+# Seeded from the monotonic clock rather than 0: st.cache_data entries survive a
+# Streamlit hot reload of this module, and a restarted count would hit stale ones
+_db_version = time.monotonic_ns()
+
+# Set once update_db_schema has migrated this process's database; reruns skip it
+_schema_checked = False
+
+
+def get_db_version() -> int:
+    """
+    Return the current write counter for cache keys.
+    """
+    return _db_version
+
+
+def bump_db_version() -> None:
+    """
+    Invalidate cached reads by advancing the write counter.
+    Must be called after every committed write to decks or cards.
+    """
+    global _db_version
+    _db_version += 1
+
+
+def _now_ts() -> int:
+    """
+    Current time as integer Unix epoch seconds, the storage format of next_review.
+    """
+    return int(datetime.now().timestamp())
+
+
+def _configure_connection() -> None:
+    """
+    Apply per-connection PRAGMAs once, when the module opens the connection.
+    """
+    # Tune the connection: WAL lets readers proceed during commits,
+    # NORMAL sync avoids an fsync per commit, plus a larger cache and busy timeout
+    c.execute("PRAGMA journal_mode=WAL")
+    journal_mode = c.fetchone()[0]
+    if journal_mode.lower() != "wal":
+        logger.warning("Could not enable WAL journaling (mode=%s).", journal_mode)
+    c.execute("PRAGMA synchronous=NORMAL")
+    c.execute("PRAGMA temp_store=MEMORY")
+    c.execute("PRAGMA cache_size=-64000")
+    c.execute("PRAGMA busy_timeout=30000")
+    c.execute("PRAGMA mmap_size=268435456")
+
+    # Enforce foreign keys so deleting a deck cascades to its cards
+    c.execute("PRAGMA foreign_keys=ON")
+
+
+_configure_connection()
+
 
 def init_db() -> None:
     """
     Create decks and cards tables if they do not exist.
     Ensures a fresh database schema for storing flashcard data.
     """
-    # Create a table for decks with unique names
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS decks (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT UNIQUE
-        )
-    ''')
-
-    # Create a table for cards, including scheduling metadata for SM-2
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS cards (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            deck_id INTEGER,
-            front TEXT,
-            back TEXT,
-            next_review TIMESTAMP,
-            interval REAL,
-            repetition INTEGER,
-            ef REAL,
-            extra_fields TEXT,
-            FOREIGN KEY(deck_id) REFERENCES decks(id)
+    with db_lock:
+        # Create a table for decks with unique names
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS decks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT UNIQUE
+            )
+        ''')
+
+        # Create a table for cards, including scheduling metadata for SM-2
+        conn.execute(f"CREATE TABLE IF NOT EXISTS cards ({_CARDS_TABLE_COLUMNS})")
+
+        # Index the deck_id filters used by every deck-level query
+        cur = conn.execute(
+            "SELECT COUNT(*) FROM sqlite_master"
+            " WHERE type = 'index' AND name IN ('idx_cards_deck', 'idx_cards_deck_due')"
         )
-    ''')
+        indexes_existed = cur.fetchone()[0] == 2
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_cards_deck ON cards(deck_id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_cards_deck_due ON cards(deck_id, next_review)")
 
-    # Persist schema changes
-    conn.commit()
+        # Gather planner statistics once, right after the indexes are first built
+        if not indexes_existed:
+            conn.execute("ANALYZE")
+
+        # Persist schema changes
+        conn.commit()
 
 
 def update_db_schema() -> None:
     """
-    Add missing columns to the cards table for SM-2 fields.
+    Add missing columns to the cards table for SM-2 fields,
+    and rebuild it with ON DELETE CASCADE if its deck foreign key lacks it.
     Useful when upgrading an existing database schema.
+    Runs once per process; later calls return immediately.
     """
-    # Inspect existing columns in the cards table
-    c.execute("PRAGMA table_info(cards)")
-    columns = [info[1] for info in c.fetchall()]
-
-    # Conditionally apply ALTER TABLE statements
-    if "next_review" not in columns:
-        c.execute("ALTER TABLE cards ADD COLUMN next_review TIMESTAMP")
-    if "interval" not in columns:
-        c.execute("ALTER TABLE cards ADD COLUMN interval REAL DEFAULT 0")
-    if "repetition" not in columns:
-        c.execute("ALTER TABLE cards ADD COLUMN repetition INTEGER DEFAULT 0")
-    if "ef" not in columns:
-        c.execute("ALTER TABLE cards ADD COLUMN ef REAL DEFAULT 2.5")
-    if "extra_fields" not in columns:
-        c.execute("ALTER TABLE cards ADD COLUMN extra_fields TEXT")
+    global _schema_checked
+    if _schema_checked:
+        return
+
+    with db_lock:
+        if _schema_checked:
+            return
+
+        # Inspect existing columns in the cards table
+        cur = conn.execute("PRAGMA table_info(cards)")
+        columns = [info[1] for info in cur.fetchall()]
+
+        # Conditionally apply ALTER TABLE statements
+        if "next_review" not in columns:
+            conn.execute("ALTER TABLE cards ADD COLUMN next_review INTEGER")
+        if "interval" not in columns:
+            conn.execute("ALTER TABLE cards ADD COLUMN interval REAL DEFAULT 0")
+        if "repetition" not in columns:
+            conn.execute("ALTER TABLE cards ADD COLUMN repetition INTEGER DEFAULT 0")
+        if "ef" not in columns:
+            conn.execute("ALTER TABLE cards ADD COLUMN ef REAL DEFAULT 2.5")
+        if "extra_fields" not in columns:
+            conn.execute("ALTER TABLE cards ADD COLUMN extra_fields TEXT")
+
+        # Convert legacy ISO-8601 next_review strings (local time) to Unix epoch seconds;
+        # probe for one first so an already-migrated table skips the full-table UPDATE
+        if conn.execute("SELECT 1 FROM cards WHERE typeof(next_review) = 'text' LIMIT 1").fetchone():
+            conn.execute(
+                "UPDATE cards SET next_review = CAST(strftime('%s', next_review, 'utc') AS INTEGER)"
+                " WHERE typeof(next_review) = 'text'"
+            )
+
+        # Commit any schema updates
+        conn.commit()
 
-    # Commit any schema updates
-    conn.commit()
+        # Older tables declare the deck foreign key without ON DELETE CASCADE (or not at all);
+        # SQLite cannot alter a constraint, so copy the rows into a rebuilt table. The old
+        # table's sqlite_sequence row is handed to the new one before the DROP (which would
+        # delete it), so the AUTOINCREMENT high-water mark survives and deleted ids stay unused
+        cur = conn.execute("PRAGMA foreign_key_list(cards)")
+        if not any(fk[2] == "decks" and fk[6] == "CASCADE" for fk in cur.fetchall()):
+            conn.executescript(f"""
+                PRAGMA foreign_keys=OFF;
+                BEGIN;
+                CREATE TABLE cards_new ({_CARDS_TABLE_COLUMNS});
+                INSERT INTO cards_new
+                    (id, deck_id, front, back, next_review, interval, repetition, ef, extra_fields)
+                SELECT id, deck_id, front, back, next_review, interval, repetition, ef, extra_fields
+                  FROM cards;
+                DELETE FROM sqlite_sequence WHERE name = 'cards_new';
+                UPDATE sqlite_sequence SET name = 'cards_new' WHERE name = 'cards';
+                DROP TABLE cards;
+                ALTER TABLE cards_new RENAME TO cards;
+                CREATE INDEX idx_cards_deck ON cards(deck_id);
+                CREATE INDEX idx_cards_deck_due ON cards(deck_id, next_review);
+                COMMIT;
+                PRAGMA foreign_keys=ON;
+            """)
+            logger.info("Rebuilt cards table with ON DELETE CASCADE.")
+
+        _schema_checked = True
 
 
 def reset_deck(deck_id: int) -> None:
@@ -81,26 +243,37 @@ def reset_deck(deck_id: int) -> None:
     Reset all scheduling data for a given deck.
     Sets next_review to NULL and resets SM-2 fields to defaults.
     """
-    c.execute(
-        """
-        UPDATE cards
-           SET next_review = NULL,
-               interval     = 0,
-               repetition   = 0,
-               ef           = 2.5
-         WHERE deck_id = ?
-        """,
-        (deck_id,)
-    )
-    conn.commit()
+    with db_lock:
+        conn.execute(
+            """
+            UPDATE cards
+               SET next_review = NULL,
+                   interval     = 0,
+                   repetition   = 0,
+                   ef           = 2.5
+             WHERE deck_id = ?
+            """,
+            (deck_id,)
+        )
+        conn.commit()
+        bump_db_version()
 
 
 def get_decks() -> list[tuple[int, str]]:
     """
     Retrieve all decks as a list of (id, name) tuples.
     """
-    c.execute("SELECT id, name FROM decks")
-    return c.fetchall()
+    cur = conn.execute(_SQL_GET_DECKS)
+    return cur.fetchall()
+
+
+def get_deck_name(deck_id: int) -> str | None:
+    """
+    Return the name of a deck, or None if no deck has that id.
+    """
+    cur = conn.execute(_SQL_GET_DECK_NAME, (deck_id,))
+    row = cur.fetchone()
+    return row[0] if row else None
 
 
 def create_deck(deck_name: str) -> None:
@@ -110,8 +283,10 @@ def create_deck(deck_name: str) -> None:
     """
     import streamlit as st
     try:
-        c.execute("INSERT INTO decks (name) VALUES (?)", (deck_name,))
-        conn.commit()
+        with db_lock:
+            conn.execute("INSERT INTO decks (name) VALUES (?)", (deck_name,))
+            conn.commit()
+            bump_db_version()
         st.success(f"Deck '{deck_name}' created!")
     except sqlite3.IntegrityError:
         # Unique constraint violation if name already exists
@@ -122,32 +297,73 @@ def rename_deck(deck_id: int, new_name: str) -> None:
     """
     Change the name of an existing deck identified by deck_id.
     """
-    c.execute(
-        "UPDATE decks SET name = ? WHERE id = ?", (new_name, deck_id)
-    )
-    conn.commit()
+    with db_lock:
+        conn.execute(
+            "UPDATE decks SET name = ? WHERE id = ?", (new_name, deck_id)
+        )
+        conn.commit()
+        bump_db_version()
 
 
-def get_cards(deck_id: int) -> list[tuple[int, str, str]]:
+def get_cards(deck_id: int) -> list[tuple]:
     """
-    Fetch all cards for a given deck as (id, front, back) tuples.
+    Fetch all cards for a given deck, ordered by id, as
+    (id, front, back, next_review, interval, repetition, ef) tuples.
     """
-    c.execute(
-        "SELECT id, front, back FROM cards WHERE deck_id = ?", (deck_id,)
-    )
-    return c.fetchall()
+    cur = conn.execute(_SQL_GET_CARDS, (deck_id,))
+    return cur.fetchall()
 
 
-def get_card_by_id(card_id: int) -> tuple | None:
+def get_cards_page(deck_id: int, limit: int, offset: int) -> list[tuple]:
+    """
+    Fetch one page of a deck's cards in the same shape and order as get_cards.
+    """
+    cur = conn.execute(_SQL_GET_CARDS_PAGE, (deck_id, limit, offset))
+    return cur.fetchall()
+
+
+def count_cards(deck_id: int) -> int:
+    """
+    Return the number of cards in a deck.
+    """
+    cur = conn.execute(_SQL_COUNT_CARDS, (deck_id,))
+    return cur.fetchone()[0]
+
+
+def get_next_card_id(deck_id: int, current_id: int) -> int | None:
+    """
+    Return the id of the card following current_id in a deck, wrapping
+    around to the first card. Returns None if the deck has no cards.
+    """
+    cur = conn.execute(_SQL_NEXT_CARD_ID, (deck_id, current_id))
+    row = cur.fetchone()
+    if row:
+        return row[0]
+
+    # Wrap around to the lowest id in the deck
+    cur = conn.execute(_SQL_FIRST_CARD_ID, (deck_id,))
+    return cur.fetchone()[0]
+
+
+def get_next_due_card_id(deck_id: int, now_ts: int | None = None) -> int | None:
+    """
+    Return the id of the next card to review in a deck: new cards first,
+    then due cards by earliest next_review. Returns None if nothing is due.
+    """
+    now_ts = now_ts or _now_ts()
+    cur = conn.execute(_SQL_NEXT_DUE_CARD_ID, (deck_id, now_ts))
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def get_card_by_id(card_id: int) -> CardRow | None:
     """
     Retrieve full card data by its ID, including SM-2 fields and extras.
-    Returns a tuple or None if not found.
+    Returns a CardRow or None if not found.
     """
-    c.execute(
-        "SELECT id, deck_id, front, back, next_review, interval, repetition, ef, extra_fields"
-        " FROM cards WHERE id = ?", (card_id,)
-    )
-    return c.fetchone()
+    cur = conn.execute(_SQL_GET_CARD_BY_ID, (card_id,))
+    row = cur.fetchone()
+    return CardRow._make(row) if row else None
 
 
 def add_card(
@@ -160,27 +376,42 @@ def add_card(
     Insert a new card into a deck, initializing SM-2 metadata.
     extra_fields can hold JSON-serializable additional data.
     """
-    import json
-
     # Serialize extra_fields dict to JSON or use None
-    extra_fields_json = json.dumps(extra_fields) if extra_fields else None
-    c.execute(
-        """
-        INSERT INTO cards
-            (deck_id, front, back, next_review, interval, repetition, ef, extra_fields)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """,
-        (deck_id, front, back, None, 0, 0, 2.5, extra_fields_json)
-    )
-    conn.commit()
+    extra_fields_json = json_helper.dumps(extra_fields) if extra_fields else None
+    with db_lock:
+        conn.execute(
+            _SQL_INSERT_CARD,
+            (deck_id, front, back, None, 0, 0, 2.5, extra_fields_json)
+        )
+        conn.commit()
+        bump_db_version()
 
 
-def delete_card(card_id: int) -> None:
+def add_cards(deck_id: int, cards: list[tuple[str, str]]) -> None:
+    """
+    Insert several (front, back) cards into a deck in one transaction,
+    initializing SM-2 metadata as add_card does.
+    """
+    with db_lock:
+        conn.executemany(
+            _SQL_INSERT_CARD,
+            ((deck_id, front, back, None, 0, 0, 2.5, None) for front, back in cards)
+        )
+        conn.commit()
+        bump_db_version()
+
+
+def delete_card(card_id: int) -> int | None:
     """
     Permanently remove a card from the database by its ID.
+    Returns the deck_id the card belonged to, or None if no card matched.
     """
-    c.execute("DELETE FROM cards WHERE id = ?", (card_id,))
-    conn.commit()
+    with db_lock:
+        cur = conn.execute("DELETE FROM cards WHERE id = ? RETURNING deck_id", (card_id,))
+        row = cur.fetchone()
+        conn.commit()
+        bump_db_version()
+    return row[0] if row else None
 
 
 def update_card(
@@ -188,33 +419,40 @@ def update_card(
     front: str,
     back: str,
     extra_fields: dict | None = None
-) -> None:
+) -> CardRow | None:
     """
     Update front, back, and extra_fields of an existing card.
+    Returns the updated CardRow or None if no card matched.
     """
-    import json
-    extra_fields_json = json.dumps(extra_fields) if extra_fields else None
-    c.execute(
-        """
-        UPDATE cards
-           SET front = ?, back = ?, extra_fields = ?
-         WHERE id = ?
-        """,
-        (front, back, extra_fields_json, card_id)
-    )
-    conn.commit()
+    extra_fields_json = json_helper.dumps(extra_fields) if extra_fields else None
+    with db_lock:
+        cur = conn.execute(
+            """
+            UPDATE cards
+               SET front = ?, back = ?, extra_fields = ?
+             WHERE id = ?
+            RETURNING id, deck_id, front, back, next_review, interval, repetition, ef, extra_fields
+            """,
+            (front, back, extra_fields_json, card_id)
+        )
+        row = cur.fetchone()
+        conn.commit()
+        bump_db_version()
+    return CardRow._make(row) if row else None
 
 
 def trash_deck(deck_id: int) -> None:
     """
     Delete a deck and all its associated cards permanently.
+    Cards are removed by the ON DELETE CASCADE foreign key.
     """
-    c.execute("DELETE FROM decks WHERE id = ?", (deck_id,))
-    c.execute("DELETE FROM cards WHERE deck_id = ?", (deck_id,))
-    conn.commit()
+    with db_lock:
+        conn.execute("DELETE FROM decks WHERE id = ?", (deck_id,))
+        conn.commit()
+        bump_db_version()
 
 
-def get_deck_stats(deck_id: int) -> dict[str, int]:
+def get_deck_stats(deck_id: int, now_ts: int | None = None) -> dict[str, int]:
     """
     Compute new, learn, and due counts for a deck to drive dashboard metrics.
 
@@ -222,31 +460,50 @@ def get_deck_stats(deck_id: int) -> dict[str, int]:
     - due: cards with next_review <= now
     - learn: cards with next_review > now
 
+    now_ts lets callers that query several decks compute the timestamp once.
     Returns a dict with keys 'new', 'learn', 'due'.
     """
-    now_str = datetime.now().isoformat()
+    now_ts = now_ts or _now_ts()
 
-    # Count new cards
-    c.execute(
-        "SELECT COUNT(*) FROM cards"
-        " WHERE deck_id = ? AND (repetition = 0 OR next_review IS NULL)",
-        (deck_id,)
+    # All three counts in one pass over the deck's rows (served by idx_cards_deck_due)
+    cur = conn.execute(
+        """
+        SELECT COUNT(CASE WHEN repetition = 0 OR next_review IS NULL THEN 1 END),
+               COUNT(CASE WHEN next_review IS NOT NULL AND next_review > ?  THEN 1 END),
+               COUNT(CASE WHEN next_review IS NOT NULL AND next_review <= ? THEN 1 END)
+          FROM cards
+         WHERE deck_id = ?
+        """,
+        (now_ts, now_ts, deck_id)
     )
-    new = c.fetchone()[0]
+    new, learn, due = cur.fetchone()
+    return {"new": new, "learn": learn, "due": due}
 
-    # Count due cards
-    c.execute(
-        "SELECT COUNT(*) FROM cards"
-        " WHERE deck_id = ? AND next_review IS NOT NULL AND next_review <= ?",
-        (deck_id, now_str)
-    )
-    due = c.fetchone()[0]
-    
-    # Count cards in learning phase
-    c.execute(
-        "SELECT COUNT(*) FROM cards"
-        " WHERE deck_id = ? AND next_review IS NOT NULL AND next_review > ?",
-        (deck_id, now_str)
+
+def get_all_deck_stats(now_ts: int | None = None) -> dict[int, dict[str, int]]:
+    """
+    Compute new, learn, and due counts for every deck in a single grouped query.
+    Uses the same definitions as get_deck_stats; the timestamp is bound once for all decks.
+
+    Returns a dict mapping deck_id to a dict with keys 'new', 'learn', 'due'.
+    """
+    now_ts = now_ts or _now_ts()
+
+    # One conditional aggregate over all decks; LEFT JOIN keeps empty decks
+    cur = conn.execute(
+        """
+        SELECT d.id,
+               SUM(CASE WHEN c.id IS NOT NULL
+                         AND (c.repetition = 0 OR c.next_review IS NULL) THEN 1 ELSE 0 END),
+               SUM(CASE WHEN c.next_review IS NOT NULL AND c.next_review > ?  THEN 1 ELSE 0 END),
+               SUM(CASE WHEN c.next_review IS NOT NULL AND c.next_review <= ? THEN 1 ELSE 0 END)
+          FROM decks d
+          LEFT JOIN cards c ON c.deck_id = d.id
+         GROUP BY d.id
+        """,
+        (now_ts, now_ts)
     )
-    learn = c.fetchone()[0]
-    return {"new": new, "learn": learn, "due": due}
+    return {
+        deck_id: {"new": new, "learn": learn, "due": due}
+        for deck_id, new, learn, due in cur.fetchall()
+    }
@@ -4,11 +4,28 @@
 Implements the SM-2 spaced repetition algorithm for flashcards.
 Provides functions to update card review schedules based on user feedback
 and to project next intervals without persisting changes.
+The scalar SM-2 step and interval conversion are public so notebook notes share them.
 Also includes a helper to format intervals concisely for UI display.
 """
 
 from datetime import datetime, timedelta
-from utils.flashcards_db import get_card_by_id, c, conn
+from functools import lru_cache
+
+from utils.flashcards_db import CardRow, bump_db_version, db_lock, get_card_by_id, conn
+
+# Module-level so every review reuses the same cached prepared statement
+_SQL_UPDATE_SM2 = (
+    "UPDATE cards SET next_review = ?, interval = ?, repetition = ?, ef = ? WHERE id = ?"
+)
+
+# (card_id, epoch second, result) of the latest update_sm2 write, so a double-clicked
+# grade button does not apply the same review twice
+_last_update: tuple[int, int, tuple] | None = None
+
+# Per-grade tables for passing reviews (3 = Hard, 4 = Good, 5 = Easy):
+# first-pass intervals in days (6 minutes, 10 minutes, 2 days) and the EF multiplier
+_FIRST_PASS_INTERVAL = {3: 6 / 1440, 4: 10 / 1440, 5: 2}
+_INTERVAL_MULT = {3: 0.9, 4: 1.0, 5: 1.3}
 
 
 def update_sm2(card_id: int, quality: int):
@@ -22,112 +39,96 @@ def update_sm2(card_id: int, quality: int):
 
     Returns:
         Tuple (next_review_datetime, interval_days, repetition_count, ef)
-        or (None, None, None, None) if card not found.
+        or (None, None, None, None) if the card is not found or quality is out of range.
+        A repeat call for the same card within the same second returns the first result
+        without writing again.
     """
+    global _last_update
+    if not 0 <= quality <= 5:
+        return None, None, None, None
+
     now = datetime.now()
+    second = int(now.timestamp())
+    if _last_update is not None and _last_update[:2] == (card_id, second):
+        return _last_update[2]
+
     card = get_card_by_id(card_id)
     if not card:
         # No card retrieved; abort update
         return None, None, None, None
 
     # Unpack existing SM-2 fields or use defaults
-    # card format: (id, deck_id, front, back, next_review, interval, repetition, ef, extra_fields)
-    interval = card[5] if card[5] is not None else 0
-    repetition = card[6] if card[6] is not None else 0
-    ef = card[7] if card[7] is not None else 2.5
-
-    if quality < 3:
-        # Treat as failed review: reset repetition and schedule soon
-        repetition = 1
-        interval = 1 / 1440  # 1 minute expressed in days
-        next_review = now + timedelta(minutes=1)
-    else:
-        # Successful review: adjust easiness factor
-        new_ef = ef + (0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
-        ef = max(new_ef, 1.3)  # EF should not drop below 1.3
-
-        if repetition == 0:
-            # First time passing: set initial intervals
-            repetition = 1
-            if quality == 3:
-                # Hard: review after 6 minutes
-                interval = 6 / 1440
-                next_review = now + timedelta(minutes=6)
-            elif quality == 4:
-                # Good: review after 10 minutes
-                interval = 10 / 1440
-                next_review = now + timedelta(minutes=10)
-            else:
-                # Easy: review after 2 days
-                interval = 2
-                next_review = now + timedelta(days=2)
-        else:
-            # Subsequent repetition: multiply by EF
-            repetition += 1
-            base = interval if interval >= 1 else 1
-            if quality == 3:
-                interval = round(base * ef * 0.9)
-            elif quality == 4:
-                interval = round(base * ef)
-            else:
-                interval = round(base * ef * 1.3)
-
-            # Schedule next review after computed days
-            next_review = now + timedelta(days=interval)
-
-    # Persist updated scheduling back to the database
-    next_review_str = next_review.isoformat()
-    c.execute(
-        "UPDATE cards SET next_review = ?, interval = ?, repetition = ?, ef = ? WHERE id = ?",
-        (next_review_str, interval, repetition, ef, card_id)
-    )
-    conn.commit()
-    return next_review, interval, repetition, ef
-
-
-def project_interval(card: tuple, quality: int) -> timedelta:
+    interval = card.interval if card.interval is not None else 0
+    repetition = card.repetition if card.repetition is not None else 0
+    ef = card.ef if card.ef is not None else 2.5
+
+    interval, repetition, ef = sm2_core(quality, interval, repetition, ef)
+    next_review = now + interval_to_timedelta(interval)
+
+    # Persist updated scheduling back to the database (next_review as epoch seconds)
+    with db_lock:
+        conn.execute(
+            _SQL_UPDATE_SM2,
+            (int(next_review.timestamp()), interval, repetition, ef, card_id)
+        )
+        conn.commit()
+        bump_db_version()
+        result = (next_review, interval, repetition, ef)
+        _last_update = (card_id, second, result)
+    return result
+
+
+def project_interval(card: CardRow, quality: int) -> timedelta:
     """
     Compute the next review interval for a card without saving changes.
 
     Parameters:
-        card: tuple from get_card_by_id containing scheduling fields.
+        card: CardRow from get_card_by_id containing scheduling fields.
         quality: integer rating as in update_sm2.
 
     Returns:
         A timedelta until the next review.
     """
     # Extract SM-2 values or use defaults
-    interval = card[5] if card[5] is not None else 0
-    repetition = card[6] if card[6] is not None else 0
-    ef = card[7] if card[7] is not None else 2.5
+    interval = card.interval if card.interval is not None else 0
+    repetition = card.repetition if card.repetition is not None else 0
+    ef = card.ef if card.ef is not None else 2.5
+    return interval_to_timedelta(sm2_core(quality, interval, repetition, ef)[0])
+
 
+@lru_cache(maxsize=4096)
+def sm2_core(quality: int, interval: float, repetition: int, ef: float) -> tuple[float, int, float]:
+    """
+    Scalar SM-2 step shared by the flashcard and note schedulers: no clock, no DB.
+    Memoized since reviews keep hitting the same (quality, interval, repetition, ef).
+
+    Returns:
+        Tuple (interval_days, repetition_count, ef) after a review of the given quality.
+    """
     if quality < 3:
-        # If review failed: next review in 1 minute
-        return timedelta(minutes=1)
-    
-    # Adjust EF for successful review
-    new_ef = ef + (0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
-    new_ef = max(new_ef, 1.3)
+        # Treat as failed review: reset repetition and schedule in 1 minute
+        return 1 / 1440, 1, ef
+
+    # Successful review: adjust easiness factor, never below 1.3
+    ef = max(ef + (0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02)), 1.3)
 
     if repetition == 0:
-        # First pass intervals
-        if quality == 3:
-            return timedelta(minutes=6)
-        elif quality == 4:
-            return timedelta(minutes=10)
-        else:
-            return timedelta(days=2)
-        
-    # Subsequent passes: scale base interval
+        # First time passing: fixed interval per grade
+        return _FIRST_PASS_INTERVAL[quality], 1, ef
+
+    # Subsequent repetition: multiply base interval by EF and the grade multiplier
     base = interval if interval >= 1 else 1
-    
-    if quality == 3:
-        new_interval = round(base * new_ef * 0.9)
-    elif quality == 4:
-        new_interval = round(base * new_ef)
-    else:
-        new_interval = round(base * new_ef * 1.3)
-    return timedelta(days=new_interval)
+    interval = round(base * ef * _INTERVAL_MULT[quality])
+    return interval, repetition + 1, ef
+
+
+def interval_to_timedelta(interval: float) -> timedelta:
+    """
+    Convert an interval in days to a timedelta; sub-day steps are whole minutes.
+    """
+    if interval < 1:
+        return timedelta(minutes=round(interval * 1440))
+    return timedelta(days=interval)
 
 
 def format_interval_short(td: timedelta) -> str:
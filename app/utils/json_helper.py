@@ -0,0 +1,46 @@
+# json_helper.py
+
+"""
+Fast JSON encode/decode helpers for deck exports and card extra_fields.
+Uses orjson when it is installed and falls back to the standard json module.
+"""
+
+import json
+
+try:
+    import orjson
+except ImportError:
+    # orjson is an optional speedup; stdlib json produces equivalent output
+    orjson = None
+
+# Raised by loads() on malformed input (orjson's error subclasses this)
+JSONDecodeError = json.JSONDecodeError
+
+
+def dumps(obj, *, indent: bool = False) -> str:
+    """
+    Serialize obj to a JSON string, optionally pretty-printed with 2-space indentation.
+    """
+    if orjson is not None:
+        return dumpb(obj, indent=indent).decode("utf-8")
+    return json.dumps(obj, indent=2 if indent else None)
+
+
+def dumpb(obj, *, indent: bool = False) -> bytes:
+    """
+    Serialize obj to UTF-8 JSON bytes, e.g. for download buttons.
+    With orjson this skips the bytes -> str -> bytes round trip of dumps().
+    """
+    if orjson is not None:
+        option = orjson.OPT_INDENT_2 if indent else 0
+        return orjson.dumps(obj, option=option)
+    return json.dumps(obj, indent=2 if indent else None).encode("utf-8")
+
+
+def loads(data: str | bytes):
+    """
+    Parse a JSON string or bytes into Python objects.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
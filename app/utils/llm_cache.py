@@ -0,0 +1,91 @@
+# llm_cache.py
+
+"""
+SQLite-backed exact-match cache for deterministic LLM responses.
+Keys are SHA-256 digests of the full request (model, messages, response schema),
+so re-processing the same file returns stored responses instead of calling the API.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+
+# How long a cached response stays valid
+DEFAULT_TTL_SECONDS = 86400
+
+
+class LLMCache:
+    """
+    Persistent key -> response store with per-entry expiry.
+    Safe to share between threads.
+    """
+    def __init__(self, path: str, ttl: int = DEFAULT_TTL_SECONDS):
+        """
+        Open (or create) the cache database at path.
+        """
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            '''CREATE TABLE IF NOT EXISTS responses (
+                   key      TEXT PRIMARY KEY,
+                   value    TEXT NOT NULL,
+                   expires  INTEGER NOT NULL  -- epoch seconds
+               )'''
+        )
+
+        # Drop responses that expired since the cache was last opened
+        self._conn.execute("DELETE FROM responses WHERE expires <= ?", (int(time.time()),))
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model: str, messages: list, response_format) -> str:
+        """
+        Hash everything that determines a temperature-0 response.
+        """
+        if isinstance(response_format, dict):
+            schema = response_format
+        else:
+            schema = response_format.model_json_schema()
+        payload = json.dumps(
+            {"model": model, "messages": messages, "schema": schema},
+            sort_keys=True
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key: str, stats: dict | None = None) -> str | None:
+        """
+        Return the cached response for key, or None if missing or expired.
+        If stats is given, its "hits" or "misses" count is incremented under the cache lock.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM responses WHERE key = ? AND expires > ?",
+                (key, int(time.time()))
+            ).fetchone()
+            if stats is not None:
+                stats["hits" if row else "misses"] += 1
+        return row[0] if row else None
+
+    def set(self, key: str, value: str) -> None:
+        """
+        Store value under key for the cache's TTL, replacing any previous entry.
+        """
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, expires) VALUES (?, ?, ?)",
+                (key, value, int(time.time()) + self.ttl)
+            )
+            self._conn.commit()
+
+
+@lru_cache(maxsize=None)
+def get_cache(media_dir: str) -> LLMCache:
+    """
+    Return the process-wide cache stored in media_dir, opening it on first use.
+    """
+    return LLMCache(os.path.join(media_dir, ".llm_cache.db"))
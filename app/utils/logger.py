@@ -9,16 +9,39 @@ consistent timestamped log messages throughout the application.
 
 import logging
 
-# Initialize the root logger with INFO level and a structured format:
+# Structured log format:
 # - Timestamp: when the log entry was created
 # - Logger name: identifies the source module
 # - Log level: INFO, WARNING, ERROR, etc.
 # - Message: the actual log text
-logging.basicConfig(
-    level=logging.INFO,
-    format="\n[%(asctime)s] [%(name)s] %(levelname)s: %(message)s"
-)
+LOG_FORMAT = "\n[%(asctime)s] [%(name)s] %(levelname)s: %(message)s"
+
+# Name of the application logger exported below
+APP_LOGGER_NAME = "flashcard_app"
+
+
+def configure_logging(level: int = logging.INFO) -> None:
+    """
+    Install the console handler on the root logger, once.
+    If a host process already attached a console handler, it is left alone
+    rather than stacking a second one that would print every record twice.
+    The application logger's level is set either way, so its records are
+    not filtered out by a root logger left at WARNING.
+    """
+    logging.getLogger(APP_LOGGER_NAME).setLevel(level)
+
+    # Exact type check: FileHandler subclasses StreamHandler but does not print to the console
+    root = logging.getLogger()
+    if any(type(h) is logging.StreamHandler for h in root.handlers):
+        return
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    root.addHandler(handler)
+    root.setLevel(level)
+
+
+configure_logging()
 
 # Create and name a logger instance for the application:
 # Using a specific name allows for fine-grained control if needed.
-logger = logging.getLogger("flashcard_app")
+logger = logging.getLogger(APP_LOGGER_NAME)
@@ -5,7 +5,21 @@ Utility class for interacting with OpenAI API tailored to EduForge flows.
 Supports text token counting, prompt templating, content rewriting, and flashcard/note generation.
 """
 
-import sys
+import atexit
+import hashlib
+import json
+import logging
+import os
+import queue
+import random
+import ssl
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from functools import lru_cache
+import httpx
+import openai
 import tiktoken
 from enum import Enum
 from openai import OpenAI
@@ -13,19 +27,308 @@ from rich.console import Console
 from utils import model_schemas, prompts
 from utils.logger import logger
 
+# tiktoken reads TIKTOKEN_CACHE_DIR on its first encoding load, not at import, so this
+# only has to run before the first token count. Keep its downloaded BPE files somewhere
+# that survives restarts (its default is the temp dir), so a cold start reads them from
+# disk instead of refetching them. Set TIKTOKEN_CACHE_DIR to override, e.g. to a mounted
+# volume in containers (see README).
+os.environ.setdefault("TIKTOKEN_CACHE_DIR", os.path.expanduser("~/.cache/eduforge/tiktoken"))
+
+# Account limits the shared rate limiter paces against (override per ModelHelper)
+DEFAULT_MAX_REQUESTS_PER_MINUTE = 500
+DEFAULT_MAX_TOKENS_PER_MINUTE = 200_000
+
+# Completion budgets, counted against the token limit. Structured generations keep the
+# full ceiling: a truncated response fails parsing and aborts the file's generation.
+# Only the validator, whose verdict is a single boolean, gets a small budget.
+MAX_COMPLETION_TOKENS = 16384
+VALIDATOR_COMPLETION_TOKENS = 64
+
+# Rough per-image prompt cost; base64 data URIs are not tokenized as text
+IMAGE_TOKEN_ESTIMATE = 765
+
+
+class RateLimiter:
+    """
+    Thread-safe token bucket over requests and tokens per minute.
+    Both buckets refill continuously, so calls are spread at the sustained
+    rate instead of bursting into 429s.
+    """
+    def __init__(self, max_requests_per_minute: int, max_tokens_per_minute: int):
+        self.max_requests_per_minute = max_requests_per_minute
+        self.max_tokens_per_minute = max_tokens_per_minute
+        self.available_request_capacity = float(max_requests_per_minute)
+        self.available_token_capacity = float(max_tokens_per_minute)
+        self.last_update = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, num_tokens: int):
+        """
+        Block until one request and num_tokens tokens are available, then consume them.
+        """
+        # A request larger than the whole bucket would never fit; cap it at a full bucket
+        num_tokens = min(num_tokens, self.max_tokens_per_minute)
+        while True:
+            with self._lock:
+                self._refill()
+                if self.available_request_capacity >= 1 and self.available_token_capacity >= num_tokens:
+                    self.available_request_capacity -= 1
+                    self.available_token_capacity -= num_tokens
+                    return
+                # Sleep roughly until the scarcer bucket has refilled enough
+                wait = max(
+                    (1 - self.available_request_capacity) * 60 / self.max_requests_per_minute,
+                    (num_tokens - self.available_token_capacity) * 60 / self.max_tokens_per_minute,
+                    0.001
+                )
+            time.sleep(wait)
+
+    def _refill(self):
+        """
+        Top up both buckets for the time elapsed since the last update, capped at one minute's worth.
+        """
+        now = time.monotonic()
+        elapsed = now - self.last_update
+        self.last_update = now
+        self.available_request_capacity = min(
+            self.available_request_capacity + elapsed * self.max_requests_per_minute / 60,
+            self.max_requests_per_minute
+        )
+        self.available_token_capacity = min(
+            self.available_token_capacity + elapsed * self.max_tokens_per_minute / 60,
+            self.max_tokens_per_minute
+        )
+
+
+# HTTP pool for the shared client: enough connections for concurrent pipelines and
+# chunks, idle keep-alive sockets held a minute so bursts skip the handshake
+HTTP_MAX_CONNECTIONS = 64
+HTTP_MAX_KEEPALIVE = 32
+HTTP_KEEPALIVE_EXPIRY = 60
+# Non-streamed completions send nothing until done, so the read timeout must cover
+# a full 16k-token generation; connect and pool waits should fail fast
+HTTP_TIMEOUT = httpx.Timeout(connect=5, read=300, write=60, pool=5)
+
+# Process-wide OpenAI client, created on first use (it needs OPENAI_API_KEY, which
+# module import must not require) and shared by every ModelHelper, so the TLS context
+# and connection pool are built once instead of per helper
+_client: OpenAI | None = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> OpenAI:
+    """
+    Return the shared OpenAI client, building it and its HTTP/2 keep-alive pool on first call.
+    Retries are disabled in the SDK because _call_with_retry handles them.
+    """
+    global _client
+    # Lock-free fast path; ModelHelper.client calls this on every request
+    client = _client
+    if client is not None:
+        return client
+    with _client_lock:
+        if _client is None:
+            http_client = httpx.Client(
+                verify=ssl.create_default_context(),
+                http2=True,
+                timeout=HTTP_TIMEOUT,
+                limits=httpx.Limits(
+                    max_connections=HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                    keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+                )
+            )
+            _client = OpenAI(max_retries=0, http_client=http_client)
+        return _client
+
+
+def close_client():
+    """
+    Close the shared client and its connection pool; the next get_client() builds a new one.
+    Runs at interpreter exit, and from ModelHelper.close() for scripts that want it sooner.
+    """
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+atexit.register(close_client)
+
+
+# Rich console output goes through a queue drained by a daemon thread, so rendering
+# a 16k-token response never delays the caller's next API request
+_console = Console()
+_log_queue: queue.Queue[str] = queue.Queue()
+
+
+def _drain_logs():
+    """
+    Render queued console messages forever (daemon thread).
+    """
+    while True:
+        message = _log_queue.get()
+        _console.log(message)
+        _log_queue.task_done()
+
+
+threading.Thread(target=_drain_logs, name="model-helper-log", daemon=True).start()
+
+
+def _console_log(message: str, level: int = logging.INFO):
+    """
+    Queue a Rich-markup message for the console if the app logger is enabled for level.
+    """
+    if logger.isEnabledFor(level):
+        _log_queue.put(message)
+
+
+@lru_cache(maxsize=16)
+def _get_encoding(encoding_name: str | None, model: str) -> tiktoken.Encoding:
+    """
+    Return the tiktoken encoding by name, or the one for the model if no name is given.
+    Cached so the BPE ranks are loaded once per process instead of on every token count.
+    """
+    if encoding_name:
+        return tiktoken.get_encoding(encoding_name)
+    return tiktoken.encoding_for_model(model)
+
+
+def _digest(text: str) -> bytes:
+    """
+    Short content hash used as a cache key in place of the text itself.
+    """
+    return hashlib.blake2b(text.encode(), digest_size=16).digest()
+
+
+# Token counts of long strings keyed by content digest, so the cache never holds the
+# texts themselves; shorter strings are cheaper to encode than to hash and look up
+_TOKEN_COUNT_CACHE_SIZE = 4096
+_TOKEN_COUNT_MIN_CHARS = 256
+_token_counts: OrderedDict[tuple[bytes, str], int] = OrderedDict()
+_token_counts_lock = threading.Lock()
+
+
+def _count_tokens_cached(string: str, encoding: tiktoken.Encoding) -> int:
+    """
+    Count tokens in string, reusing earlier counts of identical long strings (LRU).
+    """
+    if len(string) < _TOKEN_COUNT_MIN_CHARS:
+        return len(encoding.encode(string))
+
+    key = (_digest(string), encoding.name)
+    with _token_counts_lock:
+        if key in _token_counts:
+            _token_counts.move_to_end(key)
+            return _token_counts[key]
+
+    count = len(encoding.encode(string))
+    with _token_counts_lock:
+        _token_counts[key] = count
+        if len(_token_counts) > _TOKEN_COUNT_CACHE_SIZE:
+            _token_counts.popitem(last=False)
+    return count
+
+
+# Validator verdicts keyed by (original digest, rewrite digest); re-running a rewrite
+# of the same source that produced the same output skips the validation round-trip
+_REWRITE_VERDICT_CACHE_SIZE = 2048
+_rewrite_verdicts: OrderedDict[tuple[bytes, bytes], bool] = OrderedDict()
+_rewrite_verdicts_lock = threading.Lock()
+
+
+# Completions currently in flight, keyed by request digest: identical concurrent
+# requests (e.g. the same chunk from parallel pipelines) share one API call
+_inflight: dict[bytes, Future] = {}
+_inflight_lock = threading.Lock()
+
+
+# Transient API failures worth retrying; anything else is raised immediately
+RETRIABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+
+# Total seconds _call_with_retry may spend across attempts before giving up; with the
+# read timeout above, a timed-out request is retried at most once
+RETRY_MAX_ELAPSED = 600
+
+
+def _call_with_retry(fn, *, attempts: int = 3, base: float = 1.0, max_elapsed: float = RETRY_MAX_ELAPSED):
+    """
+    Call fn(), retrying transient OpenAI errors with exponential backoff plus jitter
+    (base * 2**i seconds). A 429 with a retry-after header waits that long instead.
+    An exhausted quota (insufficient_quota) is permanent and raised at once, as is
+    any error whose retry would end past max_elapsed seconds from the first attempt.
+    Re-raises the last error once all attempts are used.
+    """
+    start = time.monotonic()
+    for i in range(attempts):
+        try:
+            return fn()
+        except RETRIABLE_ERRORS as e:
+            if i == attempts - 1:
+                raise
+            if isinstance(e, openai.RateLimitError) and e.code == "insufficient_quota":
+                raise
+            delay = base * 2 ** i + random.random() * 0.25
+            if isinstance(e, openai.RateLimitError):
+                retry_after = e.response.headers.get("retry-after")
+                try:
+                    delay = float(retry_after)
+                except (TypeError, ValueError):
+                    pass
+            if time.monotonic() - start + delay > max_elapsed:
+                raise
+            logger.warning(
+                "LLM call failed (%s), retrying in %.1fs (attempt %d/%d)",
+                type(e).__name__, delay, i + 1, attempts
+            )
+            time.sleep(delay)
+
+
+# One limiter per (rpm, tpm) pair, shared by every ModelHelper in the process;
+# helpers are created per call, so a per-instance bucket would never throttle
+_rate_limiters: dict[tuple[int, int], RateLimiter] = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(max_requests_per_minute: int, max_tokens_per_minute: int) -> RateLimiter:
+    """
+    Return the process-wide RateLimiter for the given limits, creating it on first use.
+    """
+    key = (max_requests_per_minute, max_tokens_per_minute)
+    with _rate_limiters_lock:
+        if key not in _rate_limiters:
+            _rate_limiters[key] = RateLimiter(*key)
+        return _rate_limiters[key]
+
+
 class ModelHelper:
     """
     A helper for constructing prompts, counting tokens, and handling OpenAI completions.
     Manages separate models for text and image-based inputs.
     """
-    def __init__(self, model_text="gpt-4o-mini", model_image="gpt-4o-2024-11-20"):
+    def __init__(
+        self,
+        model_text="gpt-4o-mini",
+        model_image="gpt-4o-2024-11-20",
+        max_requests_per_minute=DEFAULT_MAX_REQUESTS_PER_MINUTE,
+        max_tokens_per_minute=DEFAULT_MAX_TOKENS_PER_MINUTE
+    ):
         """
-        Initialize with model identifiers and a Rich console for logging.
+        Initialize with model identifiers, a Rich console for logging,
+        and the shared rate limiter for the given account limits.
         """
         self.model_text = model_text # Model for text-based prompts
         self.model_image = model_image # Model variant optimized for image data
-        self.console = Console() # For rich logging in terminal
-        self.client = OpenAI() # OpenAI API client instance
+        self.console = _console # Shared Rich console; ModelHelper logs go through _console_log
+        self.rate_limiter = get_rate_limiter(max_requests_per_minute, max_tokens_per_minute)
+        self._text_encoding = _get_encoding(None, model_text) # Resolved once for get_num_tokens
 
     class PromptType(Enum):
         """
@@ -44,29 +347,78 @@ class ModelHelper:
         PromptType.VALIDATE_REWRITE: prompts.VALIDATE_REWRITE_PROMPT,
     }
 
+    @property
+    def client(self) -> OpenAI:
+        """
+        The shared OpenAI API client, looked up on every use so a helper
+        picks up a fresh pool after close_client().
+        """
+        return get_client()
+
+    def __enter__(self):
+        """
+        Allow `with ModelHelper() as helper:` in scripts and batch jobs so the
+        shared connection pool is released when the block ends.
+        """
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        """
+        Close the shared OpenAI client. Other helpers reopen a new pool on their
+        next request; the app itself leaves this to the atexit hook.
+        """
+        close_client()
+
     def get_num_tokens(self, string: str, encoding_name: str = None) -> int:
         """
         Estimate token count for a given string using tiktoken.
         If encoding_name is provided, uses that; otherwise infers from text model.
+        Counts of long strings are cached by content hash.
         """
         if encoding_name:
-            encoding = tiktoken.get_encoding(encoding_name)
+            encoding = _get_encoding(encoding_name, self.model_text)
         else:
-            encoding = tiktoken.encoding_for_model(self.model_text)
-        return len(encoding.encode(string))
+            encoding = self._text_encoding
+        return _count_tokens_cached(string, encoding)
+
+    def get_num_tokens_batch(self, strings: list[str]) -> list[int]:
+        """
+        Count tokens for many strings with the text model's encoding in one call;
+        tiktoken encodes the batch on a thread pool outside the GIL.
+        Special-token text is counted as ordinary text rather than rejected.
+        """
+        if not strings:
+            return []
+        token_lists = self._text_encoding.encode_ordinary_batch(strings, num_threads=os.cpu_count() or 1)
+        return [len(tokens) for tokens in token_lists]
 
     def get_system_message(self, prompt_type: PromptType, **kwargs) -> str:
         """
         Fill and return the system message template corresponding to a prompt type.
         Additional keyword args are formatted into the template.
         """
+        if not kwargs:
+            return self._render_template(prompt_type)
         template = self.PROMPT_TEMPLATES.get(prompt_type, "")
         return template.format(**kwargs)
+
+    @classmethod
+    @lru_cache(maxsize=32)
+    def _render_template(cls, prompt_type: PromptType) -> str:
+        """
+        Format a parameterless template once per prompt type; callers reuse the string.
+        Templates with kwargs (e.g. the validator's source text) vary per call and are
+        formatted directly instead of filling the cache with one-off prompts.
+        """
+        return cls.PROMPT_TEMPLATES.get(prompt_type, "").format()
     
     def get_rewrite(self, text: str, *, content_type: str = "text") -> str:
         """
-        Rewrite input text into clean Markdown and validate it.
-        Retries up to twice if token count is insufficient.
+        Rewrite input text into clean Markdown.
+        Retries once if the rewrite is too short, and only then asks the validator.
         """
         # Build system and user messages for the rewrite flow
         system = self.get_system_message(self.PromptType.REWRITE)
@@ -79,30 +431,45 @@ class ModelHelper:
         original_tokens = self.get_num_tokens(text)
         min_tokens = max(original_tokens - 50, 0)
 
-        rewritten, rewritten_tokens = "", 0
-        for _ in range(2):
-            # If rewritten is too short, request another completion
-            if rewritten_tokens <= min_tokens:
-                cmp = self.get_completion(
-                    messages=msgs,
-                    response_format=model_schemas.TEXT_FORMAT,
-                    run_as_image=False
-                )
-                rewritten = cmp.choices[0].message.content
-                rewritten_tokens = self.get_num_tokens(rewritten)
-            else:
-                break
+        def complete() -> tuple[str, int]:
+            cmp = self.get_completion(
+                messages=msgs,
+                response_format=model_schemas.TEXT_FORMAT,
+                run_as_image=False
+            )
+            content = cmp.choices[0].message.content
+            # The API already counted the output; only re-encode if usage is missing
+            if cmp.usage is not None:
+                return content, cmp.usage.completion_tokens
+            return content, self.get_num_tokens(content)
+
+        rewritten, rewritten_tokens = complete()
+        # If the rewrite is too short, request one more completion
+        if rewritten_tokens <= min_tokens:
+            rewritten, rewritten_tokens = complete()
 
-        # Validate the rewrite if tokens still low
+        # Validate the rewrite only if tokens are still low
         if rewritten_tokens <= min_tokens and not self._is_valid_rewrite(text, rewritten):
             raise ValueError("Rewrite validation failed – aborting.")
         return rewritten
 
-    def get_flashcards(self, conversation, system_message, user_text, run_as_image, response_format):
+    def get_flashcards(
+        self,
+        conversation,
+        system_message,
+        user_text,
+        run_as_image,
+        response_format,
+        cache=None,
+        cache_stats=None
+    ):
         """
         Generate flashcards or notes based on user input.
         Builds message list differently if processing images.
-        Logs conversation and token usage.
+        Logs token usage, and the latest exchange at DEBUG level.
+        With an LLMCache, an identical earlier request (same model, messages and schema)
+        is answered from the cache; completions are temperature 0, so it is exact.
+        Cache lookups are counted into cache_stats, if given (see LLMCache.get).
         Returns the assistant's response content.
         """
         # Initialize conversation with system message if empty
@@ -124,35 +491,55 @@ class ModelHelper:
             messages = conversation
 
         # Call completion API
-        completion = self.get_completion(
-            messages=messages,
-            response_format=response_format,
-            run_as_image=run_as_image
-        )
-        response = completion.choices[0].message.content
-        
+        key = response = None
+        if cache is not None:
+            model = self.model_image if run_as_image else self.model_text
+            key = cache.make_key(model, messages, response_format)
+            response = cache.get(key, cache_stats)
+        completion = None
+        if response is None:
+            completion = self.get_completion(
+                messages=messages,
+                response_format=response_format,
+                run_as_image=run_as_image
+            )
+            response = completion.choices[0].message.content
+            if key is not None:
+                cache.set(key, response)
+
         # Append assistant reply to history
         conversation.append({"role": "assistant", "content": response})
 
-        # Log roles and contents for inspection
-        for item in conversation:
+        # Log the new user/assistant pair for inspection; earlier turns were logged on
+        # their own call, and the reply itself is already logged by get_completion
+        for item in conversation[-2:]:
             role = item.get("role")
             content = item.get("content")
-            self.console.log(f"[bold red]{role}:[/bold red] {content}")
+            _console_log(f"[bold red]{role}:[/bold red] {content}", logging.DEBUG)
 
         # Truncate history if it grows too long
         if len(conversation) > 4:
             del conversation[1:3]
 
         # Log token usage details
-        self.console.log(f"[bold red]Token Usage:[/bold red] {completion.usage}")
+        if completion is not None:
+            _console_log(f"[bold red]Token Usage:[/bold red] {completion.usage}")
+        else:
+            _console_log("[bold red]Token Usage:[/bold red] none (cached response)")
         return response
 
     def _is_valid_rewrite(self, original: str, rewritten: str) -> bool:
         """
         Validate a rewritten text by asking the model to check correctness.
         Returns True if the validator model affirms validity.
+        Verdicts are cached per (original, rewritten) pair.
         """
+        key = (_digest(original), _digest(rewritten))
+        with _rewrite_verdicts_lock:
+            if key in _rewrite_verdicts:
+                _rewrite_verdicts.move_to_end(key)
+                return _rewrite_verdicts[key]
+
         system = self.get_system_message(
             self.PromptType.VALIDATE_REWRITE,
             user_message=original
@@ -164,36 +551,106 @@ class ModelHelper:
         cmp = self.get_completion(
             messages=msgs,
             response_format=model_schemas.RewriteValidator,
-            run_as_image=False
+            run_as_image=False,
+            max_out=VALIDATOR_COMPLETION_TOKENS
         )
         verdict = model_schemas.RewriteValidator.model_validate_json(
             cmp.choices[0].message.content
         )
-        return bool(verdict.is_valid)
+        is_valid = bool(verdict.is_valid)
+        with _rewrite_verdicts_lock:
+            _rewrite_verdicts[key] = is_valid
+            if len(_rewrite_verdicts) > _REWRITE_VERDICT_CACHE_SIZE:
+                _rewrite_verdicts.popitem(last=False)
+        return is_valid
 
-    def get_completion(self, messages: list, response_format, run_as_image: bool = False):
+    def get_completion(
+        self,
+        messages: list,
+        response_format,
+        run_as_image: bool = False,
+        max_out: int = MAX_COMPLETION_TOKENS
+    ):
         """
         Execute the OpenAI API call with appropriate model selection.
-        Catches and logs errors, then rethrows.
+        max_out caps the completion and is what the rate limiter reserves; it defaults
+        to the full ceiling, since structured output that runs out of budget fails to parse.
+        Transient failures are retried with backoff; a final failure is logged and rethrown.
+        An identical request already in flight is awaited instead of sent again.
         Returns the completion object.
         """
         # Choose model based on input type
         model = self.model_image if run_as_image else self.model_text
+        max_out = min(max_out, MAX_COMPLETION_TOKENS)
+
+        key = _digest(json.dumps(
+            [messages, getattr(response_format, "__name__", response_format), model, max_out],
+            sort_keys=True
+        ))
+        with _inflight_lock:
+            future = _inflight.get(key)
+            is_owner = future is None
+            if is_owner:
+                future = _inflight[key] = Future()
+        if not is_owner:
+            # Same payload already being sent by another thread; share its result or error
+            return future.result()
+
         try:
-            completion = self.client.beta.chat.completions.parse(
+            completion = self._send_completion(messages, response_format, model, max_out)
+            future.set_result(completion)
+            return completion
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with _inflight_lock:
+                del _inflight[key]
+
+    def _send_completion(self, messages: list, response_format, model: str, max_out: int):
+        """
+        Send one chat completion through the rate limiter and retry loop, then log it.
+        """
+        request_tokens = self._estimate_request_tokens(messages) + max_out
+
+        def call():
+            # Every attempt waits for quota: prompt tokens plus the reserved completion budget
+            self.rate_limiter.acquire(request_tokens)
+            return self.client.beta.chat.completions.parse(
                 model=model,
                 messages=messages,
                 response_format=response_format,
-                max_completion_tokens=16384,
+                max_completion_tokens=max_out,
                 temperature=0,
                 top_p=0.1
             )
+
+        try:
+            completion = _call_with_retry(call)
         except Exception as e:
             logger.error("Error calling LLM: %s", e, exc_info=True)
             raise
 
         # Log the raw model response
-        self.console.log(
+        _console_log(
             f"[bold yellow]`{model}` response:[/bold yellow] {completion.choices[0].message.content}"
         )
         return completion
+
+    def _estimate_request_tokens(self, messages: list) -> int:
+        """
+        Estimate prompt tokens for a message list: text parts are tokenized,
+        image parts count as a flat IMAGE_TOKEN_ESTIMATE.
+        """
+        total = 0
+        for message in messages:
+            content = message.get("content")
+            if isinstance(content, str):
+                total += self.get_num_tokens(content)
+                continue
+            for part in content or []:
+                if part.get("type") == "text":
+                    total += self.get_num_tokens(part.get("text", ""))
+                else:
+                    total += IMAGE_TOKEN_ESTIMATE
+        return total
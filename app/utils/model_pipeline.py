@@ -7,10 +7,13 @@ concept and note prompt handling, and error logging.
 """
 
 import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
 from rich.console import Console
 from utils import model_schemas
 from utils.logger import logger
 from utils.file_helper import FileHelper
+from utils.llm_cache import get_cache
 from utils.model_helper import ModelHelper
 
 class ModelPipeline:
@@ -18,11 +21,24 @@ class ModelPipeline:
     Handles end-to-end generation flows against OpenAI models.
     Provides methods for flashcards, notes, and underlying chunk processing.
     """
-    def __init__(self, media_dir: str):
+    def __init__(
+        self,
+        media_dir: str,
+        max_concurrency: int = 1,
+        use_cache: bool = True,
+    ):
         """
         Initialize pipeline with a media directory for storing assets.
+        max_concurrency > 1 processes chunks in parallel, each with its own
+        conversation instead of the shared history.
+        use_cache=False skips the on-disk response cache, forcing fresh generations.
         """
         self.media_dir = media_dir
+        self.max_concurrency = max_concurrency
+
+        # On-disk cache of deterministic responses, and this pipeline's lookups in it
+        self.cache = get_cache(media_dir) if use_cache else None
+        self.stats = {"hits": 0, "misses": 0}
 
         # Rich console for formatted output
         self.console = Console()
@@ -30,6 +46,14 @@ class ModelPipeline:
         # Shared conversation history (system + user messages)
         self.conversation: list = []
 
+    @cached_property
+    def _helper(self) -> ModelHelper:
+        """
+        ModelHelper shared by every flow and merge call of this pipeline.
+        Stateless apart from its configuration, so worker threads can share it.
+        """
+        return ModelHelper()
+
     def generate_flashcards(
         self,
         file_path=None,
@@ -160,27 +184,31 @@ class ModelPipeline:
         content_type: str,
         model_class,
         media_path=None,
+        conversation=None,
     ):
         """
         Core runner for concept or note flows, handling prompts and parsing.
+        Uses the shared conversation unless one is given.
         """
         print()
 
         # Visual separator for flow start
         self.console.rule(f"Running {flow_name}")
 
-        helper = ModelHelper()
+        helper = self._helper
 
         # Build system message based on flow type
         system_message = helper.get_system_message(prompt_type)
 
         # Request content generation from OpenAI
         response = helper.get_flashcards(
-            conversation=self.conversation,
+            conversation=self.conversation if conversation is None else conversation,
             system_message=system_message,
             user_text=content,
             run_as_image=(content_type not in ["text", "url"]),
-            response_format=model_class
+            response_format=model_class,
+            cache=self.cache,
+            cache_stats=self.stats
         )
 
         # Validate and parse into Pydantic model
@@ -202,6 +230,7 @@ class ModelPipeline:
         file_name,
         content_type,
         media_path,
+        conversation=None,
     ):
         """
         Run the concept (general flashcards) flow.
@@ -215,6 +244,7 @@ class ModelPipeline:
             content_type=content_type,
             model_class=model_schemas.Flashcard,
             media_path=media_path,
+            conversation=conversation,
         )
 
     def _run_note_flow(
@@ -224,6 +254,7 @@ class ModelPipeline:
         file_name,
         content_type,
         media_path,
+        conversation=None,
     ):
         """
         Run the note generation flow.
@@ -237,6 +268,7 @@ class ModelPipeline:
             content_type=content_type,
             model_class=model_schemas.Note,
             media_path=media_path,
+            conversation=conversation,
         )
 
     def _merge_chunks(self, chunks, file_name):
@@ -253,24 +285,36 @@ class ModelPipeline:
         def flush_temp_buffer():
             # Combine buffered chunks into one merged chunk
             nonlocal content_buffer, running_token_count
-            merged_chunks.append({"title": "Merged chunks", "content": ""})
-            for ch in content_buffer:
-                merged_chunks[-1]["content"] += (
-                    f"{ch['title']}:\n{ch['content']}\n------\n"
+            merged_chunks.append({
+                "title": "Merged chunks",
+                "content": "".join(
+                    f"{ch['title']}:\n{ch['content']}\n------\n" for ch in content_buffer
                 )
+            })
             content_buffer.clear()
             running_token_count = 0
 
         min_chunk_tokens = 300
         max_chunk_tokens = 1000
 
-        helper = ModelHelper()
+        helper = self._helper
+
+        # Far from either threshold the ~4 chars/token estimate picks the same branch,
+        # so only borderline chunks are tokenized exactly, all in one batched call
+        token_counts = [len(chunk["content"]) >> 2 for chunk in chunks]
+        borderline = [
+            i for i, approx in enumerate(token_counts)
+            if min_chunk_tokens // 2 <= approx <= max_chunk_tokens * 2
+        ]
+        exact_counts = helper.get_num_tokens_batch([chunks[i]["content"] for i in borderline])
+        for i, count in zip(borderline, exact_counts):
+            token_counts[i] = count
 
         # Iterate over all input chunks
         for idx, chunk in enumerate(chunks, start=1):
             heading_title = chunk.get("title", file_name)
             chunk_text = chunk["content"]
-            chunk_tokens = helper.get_num_tokens(chunk_text)
+            chunk_tokens = token_counts[idx - 1]
             logger.info(
                 f"[Chunk] '{heading_title}' has {chunk_tokens} tokens."
             )
@@ -324,7 +368,11 @@ class ModelPipeline:
         Process each text/image chunk through the appropriate flow.
 
         Merges small chunks for text/url, prints each chunk,
-        then routes to concept or note flows.
+        then routes to concept or note flows. Chunks run one after another on the
+        shared conversation, or concurrently (max_concurrency > 1) with a fresh
+        conversation each; results keep chunk order either way.
+        Chunks with identical content are generated once and the result is reused
+        at each of their positions.
         """
         print()
         self.console.rule("[bold red]Extracted and Filtered Data[/bold red]")
@@ -333,44 +381,106 @@ class ModelPipeline:
         if content_type in ["text", "url"]:
             chunks = self._merge_chunks(chunks=chunks, file_name=file_name)
 
-        results = []
-        
-        # Iterate and process each chunk
-        for idx, chunk in enumerate(chunks, start=1):
-            heading_title = chunk.get("title", file_name) or "(untitled section)"
-            chunk_text = chunk["content"]
+        # Collapse repeated content (e.g. duplicate sections) to its first occurrence
+        unique: dict[str, dict] = {}
+        for chunk in chunks:
+            unique.setdefault(chunk["content"], chunk)
+        if len(unique) < len(chunks):
+            logger.info("Skipping %d duplicate chunk(s).", len(chunks) - len(unique))
+        unique_chunks = list(unique.values())
 
-            print()
-            self.console.rule(f"[bold red]Chunk {idx}:[/bold red] {heading_title}")
+        unique_results = self._process_unique_chunks(
+            unique_chunks, card_type, url_name, file_name, content_type, media_path
+        )
+        if self.cache is not None:
+            logger.info(
+                "LLM cache: %d hit(s), %d miss(es).", self.stats["hits"], self.stats["misses"]
+            )
 
-            # Display chunk content or image message
-            if content_type in ["text", "url"]:
-                self.console.print(chunk_text)
-            elif content_type == "image":
-                self.console.print(
-                    "Processing image for flashcard generation"
-                )
-            else:
-                self.console.print(
-                    "Unsupported content type for flashcard generation."
-                )
+        # Fan each result back out to every position that had the same content
+        by_content = dict(zip(unique, unique_results))
+        results = [by_content[chunk["content"]] for chunk in chunks]
+        return [result for result in results if result is not None]
 
-            # Select flow based on card_type
-            if card_type == 'general':
-                card_model = self._run_concept_flow(
-                    content=chunk_text,
-                    url_name=url_name,
-                    file_name=file_name,
-                    content_type=content_type,
-                    media_path=media_path,
-                )
-            else:
-                card_model = self._run_note_flow(
-                    content=chunk_text,
-                    url_name=url_name,
-                    file_name=file_name,
-                    content_type=content_type,
-                    media_path=media_path,
-                )
-            results.append(card_model)
-        return results
+    def _process_unique_chunks(
+        self,
+        chunks,
+        card_type,
+        url_name,
+        file_name,
+        content_type,
+        media_path=None,
+    ):
+        """
+        Run chunks through their flows, sequentially or on a thread pool.
+        """
+        def run(item, conversation=None):
+            idx, chunk = item
+            return self._process_chunk(
+                idx=idx,
+                chunk=chunk,
+                card_type=card_type,
+                url_name=url_name,
+                file_name=file_name,
+                content_type=content_type,
+                media_path=media_path,
+                conversation=conversation,
+            )
+
+        if self.max_concurrency > 1 and len(chunks) > 1:
+            # Independent chunks: each call is network-bound, so overlap them
+            with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+                return list(pool.map(lambda item: run(item, conversation=[]), enumerate(chunks, start=1)))
+        return [run(item) for item in enumerate(chunks, start=1)]
+
+    def _process_chunk(
+        self,
+        *,
+        idx,
+        chunk,
+        card_type,
+        url_name,
+        file_name,
+        content_type,
+        media_path=None,
+        conversation=None,
+    ):
+        """
+        Print one chunk and run it through the concept or note flow.
+        """
+        heading_title = chunk.get("title", file_name) or "(untitled section)"
+        chunk_text = chunk["content"]
+
+        print()
+        self.console.rule(f"[bold red]Chunk {idx}:[/bold red] {heading_title}")
+
+        # Display chunk content or image message
+        if content_type in ["text", "url"]:
+            self.console.print(chunk_text)
+        elif content_type == "image":
+            self.console.print(
+                "Processing image for flashcard generation"
+            )
+        else:
+            self.console.print(
+                "Unsupported content type for flashcard generation."
+            )
+
+        # Select flow based on card_type
+        if card_type == 'general':
+            return self._run_concept_flow(
+                content=chunk_text,
+                url_name=url_name,
+                file_name=file_name,
+                content_type=content_type,
+                media_path=media_path,
+                conversation=conversation,
+            )
+        return self._run_note_flow(
+            content=chunk_text,
+            url_name=url_name,
+            file_name=file_name,
+            content_type=content_type,
+            media_path=media_path,
+            conversation=conversation,
+        )
@@ -5,7 +5,8 @@ Implements SM-2 spaced repetition algorithm for notebook notes.
 Provides functions to update review scheduling and to project next intervals.
 """
 
-from datetime import datetime, timedelta
+from datetime import datetime
+from utils.flashcards_sm2 import format_interval_short, interval_to_timedelta, sm2_core
 from utils.notes_db import get_note_by_id, c, conn
 
 # notes table columns: id, notebook_id, tab_name, content,
@@ -35,42 +36,9 @@ def update_sm2(note_id: int, quality: int):
     repetition = note[6] or 0 # number of successful repetitions so far
     ef         = note[7] or 2.5 # easiness factor
 
-    # If quality below threshold, reset repetition and schedule soon
-    if quality < 3:
-        repetition = 1
-
-        # tiny interval (1 minute) encoded as fraction of day
-        interval   = 1 / 1440
-        next_rev   = now + timedelta(minutes=1)
-    else:
-        # Update easiness factor, ensuring it doesn't drop below 1.3
-        ef = max(
-            1.3,
-            ef + (0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
-        )
-        if repetition == 0:
-            # First successful review: set base intervals
-            repetition = 1
-            if quality == 3:
-                interval, next_rev = 6 / 1440, now + timedelta(minutes=6)
-            elif quality == 4:
-                interval, next_rev = 10 / 1440, now + timedelta(minutes=10)
-            else:
-                # Easy: interval measured in days
-                interval, next_rev = 2, now + timedelta(days=2)
-        else:
-            # Subsequent reviews: multiply previous interval by EF
-            repetition += 1
-
-            # Ensure we multiply by at least 1 day
-            base = interval if interval >= 1 else 1
-            if quality == 3:
-                interval = round(base * ef * 0.9)
-            elif quality == 4:
-                interval = round(base * ef)
-            else:
-                interval = round(base * ef * 1.3)
-            next_rev = now + timedelta(days=interval)
+    # Same SM-2 step as flashcards, so notes and cards never drift apart
+    interval, repetition, ef = sm2_core(quality, interval, repetition, ef)
+    next_rev = now + interval_to_timedelta(interval)
 
     # Save updated scheduling back to database
     c.execute(
@@ -91,7 +59,7 @@ def update_sm2(note_id: int, quality: int):
 def project_interval(note_row, quality):
     """
     Compute what the next interval would be, without saving changes.
-    Reuses the flashcards SM-2 projection logic for consistency.
+    Uses the shared flashcards SM-2 step for consistency.
 
     Parameters:
         note_row: tuple from get_note_by_id containing SM-2 fields.
@@ -100,17 +68,8 @@ def project_interval(note_row, quality):
     Returns:
         timedelta representing projected interval until next review.
     """
-    from utils.flashcards_sm2 import project_interval as fc_project
-    # Construct a fake flashcard record to leverage shared logic
-    fake_card = (
-        None, None, None, None,
-        note_row[4], # next_review
-        note_row[5], # interval
-        note_row[6], # repetition
-        note_row[7], # ef
-        None
-    )
-    return fc_project(fake_card, quality)
-
-# Reuse the same interval formatting helper from flashcards
-from utils.flashcards_sm2 import format_interval_short
+    # Unpack SM-2 fields (interval, repetition, ef) or use defaults
+    interval = note_row[5] if note_row[5] is not None else 0
+    repetition = note_row[6] if note_row[6] is not None else 0
+    ef = note_row[7] if note_row[7] is not None else 2.5
+    return interval_to_timedelta(sm2_core(quality, interval, repetition, ef)[0])